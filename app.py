@@ -3,12 +3,21 @@ import socket
 import json
 import os
 import math
+from http import HTTPStatus
 from pathlib import Path
 
+from health import HEALTH_PATH, PROBE_HEADERS, READY_PATH, Readiness, probe_response, start_warmup
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics, route_label
+from serving import parse_args, serve_socket
+from static_files import static_files
+
 # Configuration
 PORT = 3002
 HOST = '127.0.0.1'
 FRONTEND_DIR = Path(__file__).parent / 'frontend'
+# Paths with their own series in /metrics
+ROUTES = ('/', '/index.html', '/api/dashboard/stats', '/api/dashboard/suppliers', '/metrics', '/health', '/ready')
+DASHBOARD_FILE = Path(__file__).parent / 'dashboard_with_api.html'
 
 print('[APP] Starting Walmart Supplier Server...')
 print(f'[APP] Frontend dir: {FRONTEND_DIR}')
@@ -21,6 +30,7 @@ def seeded_random(seed):
 
 # Generate suppliers ONCE at startup
 print('[APP] Generating 5000 suppliers...')
+readiness = Readiness('app', stages=('data', 'static'))
 suppliers = []
 for i in range(5000):
     seed = 1962 + i
@@ -37,9 +47,26 @@ for i in range(5000):
         'walmartVerified': seeded_random(seed + 850) > 0.3
     })
 print(f'[APP] Generated {len(suppliers)} suppliers')
+readiness.done('data', suppliersLoaded=len(suppliers))
+
+def load_dashboard():
+    if static_files.get(DASHBOARD_FILE) is None:
+        raise FileNotFoundError(DASHBOARD_FILE)
+
+def parse_headers(lines):
+    """Request header lines as a dict with lower-cased names"""
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return headers
 
 def handle_request(client_socket, addr):
     """Handle a single HTTP request"""
+    request_metrics = None
+    response = b''
     try:
         # Read request
         request = client_socket.recv(4096).decode('utf-8', errors='ignore')
@@ -50,24 +77,38 @@ def handle_request(client_socket, addr):
         
         request_line = lines[0]
         method, path, protocol = request_line.split()
+        request_metrics = metrics.start('app', method, route_label(path, ROUTES))
         
         print(f'[APP] {method} {path}')
         
         # Handle requests
         if path == '/' or path == '/index.html':
             # Serve dashboard_with_api.html instead of frontend/index.html
-            html_file = Path(__file__).parent / 'dashboard_with_api.html'
-            if html_file.exists():
-                content = html_file.read_bytes()
-                response = f"""HTTP/1.1 200 OK
-Content-Type: text/html
-Content-Length: {len(content)}
-Access-Control-Allow-Origin: *
-Cache-Control: no-cache
-\r\n""".encode() + content
+            entry = static_files.get(DASHBOARD_FILE)
+            if entry is not None:
+                headers = parse_headers(lines)
+                status, entry_headers, content = entry.response(headers.get('accept-encoding'),
+                                                                headers.get('if-none-match'),
+                                                                headers.get('if-modified-since'))
+                head = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}']
+                head.extend(f'{name}: {value}' for name, value in entry_headers)
+                head.append('Access-Control-Allow-Origin: *')
+                response = ('\r\n'.join(head) + '\r\n\r\n').encode() + content
             else:
                 response = b'HTTP/1.1 404 Not Found\r\nContent-Type: text/plain\r\n\r\n404 Not Found'
         
+        elif path in (HEALTH_PATH, READY_PATH):
+            status, body = probe_response(readiness, path)
+            head = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}', 'Content-Type: application/json',
+                    f'Content-Length: {len(body)}', 'Access-Control-Allow-Origin: *']
+            head.extend(f'{name}: {value}' for name, value in PROBE_HEADERS)
+            response = ('\r\n'.join(head) + '\r\n\r\n').encode() + body
+        
+        elif path == '/metrics':
+            body = metrics.render().encode()
+            response = (f'HTTP/1.1 200 OK\r\nContent-Type: {METRICS_CONTENT_TYPE}\r\n'
+                        f'Content-Length: {len(body)}\r\n\r\n').encode() + body
+        
         elif path.startswith('/api/'):
             # Handle API requests
             if path == '/api/dashboard/stats':
@@ -100,27 +141,32 @@ Access-Control-Allow-Origin: *
     
     except Exception as e:
         print(f'[APP] Error handling request: {e}')
+        if request_metrics is not None:
+            metrics.finish(request_metrics, 500, 0, error=True)
+            request_metrics = None
     
     finally:
         client_socket.close()
+        if request_metrics is not None:
+            metrics.finish(request_metrics, int(response.split(b' ', 2)[1]), len(response))
 
-def start_server():
+def start_server(args):
     """Start the HTTP server"""
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     
     try:
         server_socket.bind((HOST, PORT))
-        server_socket.listen(1)
+        server_socket.listen(args.backlog)
         print(f'[APP] ================================')
         print(f'[APP] Server listening on http://{HOST}:{PORT}')
         print(f'[APP] Access at: http://localhost:{PORT}')
         print(f'[APP] ================================')
+        print(f'[APP] Serving with {args.workers} workers')
         print(f'[APP] Press Ctrl+C to stop\n')
         
-        while True:
-            client_socket, addr = server_socket.accept()
-            handle_request(client_socket, addr)
+        start_warmup(readiness, load_dashboard, 'APP', 'static')
+        serve_socket(server_socket, handle_request, args.workers, args.timeout)
     
     except KeyboardInterrupt:
         print(f'\n[APP] Shutting down...')
@@ -131,4 +177,4 @@ def start_server():
         print(f'[APP] Server stopped')
 
 if __name__ == '__main__':
-    start_server()
+    start_server(parse_args('Walmart Supplier Server'))
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Async Server - asyncio HTTP/1.1 entry point for the master_server API routes
+Connections stay open between requests, pipelined requests are answered in
+order, request bodies are read in full and every write awaits drain()
+"""
+
+import argparse
+import asyncio
+import json
+import traceback
+from contextlib import suppress
+from http import HTTPStatus
+from urllib.parse import urlparse, parse_qs
+
+import master_server
+from compression import MIN_COMPRESS_BYTES, STREAM_ENCODINGS, compress, compress_chunks, negotiate
+from health import HEALTH_PATH, PROBE_HEADERS, READY_PATH, probe_response, start_warmup, warm_cache
+from json_stream import is_streamable, iter_json_cached, json_default
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics, route_label
+from response_cache import cache_key, encode_entry, etag_matches, select_variant
+
+PORT = 3000
+KEEP_ALIVE_TIMEOUT = 15.0
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type'),
+)
+
+class BadRequest(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+async def read_line(reader):
+    try:
+        return await reader.readuntil(b'\r\n')
+    except asyncio.LimitOverrunError:
+        raise BadRequest(400, 'Chunk line too long')
+
+async def read_chunked(reader):
+    body = bytearray()
+    while True:
+        size_line = await read_line(reader)
+        try:
+            size = int(size_line.split(b';', 1)[0], 16)
+        except ValueError:
+            raise BadRequest(400, 'Bad chunk size')
+        if size < 0:
+            raise BadRequest(400, 'Bad chunk size')
+        if size == 0:
+            # Skip optional trailers up to the terminating blank line
+            while await read_line(reader) != b'\r\n':
+                pass
+            return bytes(body)
+        if len(body) + size > MAX_BODY_BYTES:
+            raise BadRequest(413, 'Request body too large')
+        body += await reader.readexactly(size)
+        await reader.readexactly(2)
+
+async def read_request(reader):
+    """Parse one request off the stream: (method, target, version, headers, body)"""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.LimitOverrunError:
+        raise BadRequest(431, 'Request headers too large')
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise BadRequest(400, 'Bad request line')
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = await read_chunked(reader)
+    else:
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise BadRequest(400, 'Bad Content-Length')
+        if length < 0:
+            raise BadRequest(400, 'Bad Content-Length')
+        if length > MAX_BODY_BYTES:
+            raise BadRequest(413, 'Request body too large')
+        body = await reader.readexactly(length) if length else b''
+    return method, target, version, headers, body
+
+def wants_keep_alive(version, headers):
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.1':
+        return 'close' not in connection
+    return 'keep-alive' in connection
+
+def json_response(response, status=200, accept_encoding=None):
+    body = json.dumps(response, default=json_default).encode()
+    headers = [('Content-Type', 'application/json'), ('Vary', 'Accept-Encoding')]
+    coding = negotiate(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if coding is not None:
+        body = compress(body, coding)
+        headers.append(('Content-Encoding', coding))
+    return status, headers, body
+
+def uses_user_store(path, query):
+    """GET routes that read user_store, which can wait on disk or the writer thread"""
+    return path.startswith('/api/user/') or 'favorites' in query
+
+async def run_blocking(request_metrics, func, *args):
+    """Run func(*args) on the default executor so it cannot stall the event loop"""
+    def run():
+        # mark_error() inside func must still find this request
+        metrics.attach(request_metrics)
+        try:
+            return func(*args)
+        finally:
+            metrics.attach(None)
+    return await asyncio.get_running_loop().run_in_executor(None, run)
+
+async def dispatch(method, target, headers, body, request_metrics=None):
+    """
+    Route one request to the master_server API: (status, headers, body).
+    body is bytes, or an iterator of chunks for a streamed large page.
+    Anything touching user_store runs on the executor, since its SQLite
+    reads and group-committed writes block.
+    """
+    parsed_path = urlparse(target)
+    path = parsed_path.path
+    if method == 'OPTIONS':
+        return 200, [], b''
+    if method in ('GET', 'HEAD'):
+        if path == '/metrics':
+            return 200, [('Content-Type', METRICS_CONTENT_TYPE)], metrics.render().encode()
+        if path in (HEALTH_PATH, READY_PATH):
+            status, body = probe_response(master_server.readiness, path)
+            return status, [('Content-Type', 'application/json'), *PROBE_HEADERS], body
+        query = parse_qs(parsed_path.query)
+        if master_server.is_cacheable(path, query):
+            cache = master_server.response_cache
+            key = cache_key(path, parsed_path.query)
+            generation = cache.generation
+            entry = cache.get(key)
+            if entry is None:
+                response = master_server.api_get(path, query)
+                if is_streamable(response):
+                    chunks = iter_json_cached(response, cache, key, generation)
+                    response_headers = [('Content-Type', 'application/json'), ('Vary', 'Accept-Encoding')]
+                    coding = negotiate(headers.get('accept-encoding'), STREAM_ENCODINGS)
+                    if coding is not None:
+                        chunks = compress_chunks(chunks, coding)
+                        response_headers.append(('Content-Encoding', coding))
+                    return 200, response_headers, chunks
+                entry = encode_entry(cache, key, response, generation)
+            body, etag, coding = select_variant(entry, headers.get('accept-encoding'))
+            if etag_matches(headers.get('if-none-match'), etag):
+                return 304, [('ETag', etag), ('Vary', 'Accept-Encoding')], b''
+            response_headers = [('Content-Type', 'application/json'), ('ETag', etag), ('Vary', 'Accept-Encoding')]
+            if coding is not None:
+                response_headers.append(('Content-Encoding', coding))
+            return 200, response_headers, body
+        if uses_user_store(path, query):
+            response = await run_blocking(request_metrics, master_server.api_get, path, query)
+        else:
+            response = master_server.api_get(path, query)
+        return json_response(response, accept_encoding=headers.get('accept-encoding'))
+    if method == 'POST':
+        response = await run_blocking(request_metrics, master_server.api_post, path, body)
+        return json_response(response, accept_encoding=headers.get('accept-encoding'))
+    return json_response({'success': False, 'error': 'Method not allowed'}, 405)
+
+def write_head(writer, status, headers, keep_alive):
+    """Write the status line and headers, returning the bytes written"""
+    lines = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}']
+    lines.extend(f'{name}: {value}' for name, value in headers)
+    lines.extend(f'{name}: {value}' for name, value in CORS_HEADERS)
+    lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+    head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+    writer.write(head)
+    return len(head)
+
+def write_response(writer, status, headers, body, keep_alive, head_only=False):
+    if status != 304:
+        headers = [*headers, ('Content-Length', len(body))]
+    written = write_head(writer, status, headers, keep_alive)
+    if body and not head_only and status != 304:
+        writer.write(body)
+        written += len(body)
+    return written
+
+async def write_stream(writer, status, headers, chunks, chunked, keep_alive, head_only=False):
+    """Write a streamed body, draining after every chunk so memory stays flat"""
+    if chunked:
+        headers = [*headers, ('Transfer-Encoding', 'chunked')]
+    written = write_head(writer, status, headers, keep_alive)
+    if head_only:
+        return written
+    for chunk in chunks:
+        data = b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk
+        writer.write(data)
+        written += len(data)
+        await writer.drain()
+    if chunked:
+        writer.write(b'0\r\n\r\n')
+        written += 5
+    return written
+
+async def send_error(writer, status, message):
+    """Answer with a JSON error; the caller closes the connection afterwards"""
+    status, headers, body = json_response({'success': False, 'error': message}, status)
+    write_response(writer, status, headers, body, keep_alive=False)
+    await writer.drain()
+
+async def handle_connection(reader, writer):
+    try:
+        while True:
+            try:
+                request = await asyncio.wait_for(read_request(reader), KEEP_ALIVE_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                break
+            except BadRequest as e:
+                await send_error(writer, e.status, str(e))
+                break
+            except Exception:
+                # Whatever else stops a request from being parsed, it still gets an answer
+                await send_error(writer, 400, 'Bad request')
+                break
+            method, target, version, headers, body = request
+            keep_alive = wants_keep_alive(version, headers)
+            request_metrics = metrics.start('async', method, route_label(target, master_server.ROUTES))
+            status, written, streaming = 500, 0, False
+            try:
+                status, response_headers, response_body = await dispatch(method, target, headers, body,
+                                                                         request_metrics)
+                streaming = not isinstance(response_body, bytes)
+                if not streaming:
+                    written = write_response(writer, status, response_headers, response_body, keep_alive, method == 'HEAD')
+                else:
+                    # HTTP/1.0 has no chunked encoding; the body ends when the connection does
+                    chunked = version == 'HTTP/1.1'
+                    keep_alive = keep_alive and chunked
+                    written = await write_stream(writer, status, response_headers, response_body, chunked, keep_alive,
+                                                 method == 'HEAD')
+                # Wait for the socket to accept the bytes before reading the next request
+                await writer.drain()
+            except ConnectionError:
+                metrics.finish(request_metrics, status, written, error=True)
+                raise
+            except Exception:
+                print(f'[ASYNC] {method} {target} failed')
+                traceback.print_exc()
+                metrics.finish(request_metrics, 500, written, error=True)
+                # A streamed response has already sent its headers; all that is left is to cut it off
+                if not streaming:
+                    await send_error(writer, 500, 'Internal server error')
+                break
+            except BaseException:
+                metrics.finish(request_metrics, status, written, error=True)
+                raise
+            metrics.finish(request_metrics, status, written)
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+        with suppress(ConnectionError):
+            await writer.wait_closed()
+
+async def serve(host, port, backlog):
+    server = await asyncio.start_server(handle_connection, host, port, backlog=backlog, limit=MAX_HEADER_BYTES)
+    # Warmed off the loop thread, so probes get answered meanwhile
+    start_warmup(master_server.readiness, lambda: warm_cache(master_server.response_cache, master_server.api_get), 'ASYNC')
+    async with server:
+        await server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Async Server - keep-alive HTTP/1.1 API server')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--backlog', type=int, default=128)
+    args = parser.parse_args()
+    print(f'[ASYNC] Server running on http://{args.host}:{args.port} (HTTP/1.1 keep-alive)')
+    try:
+        asyncio.run(serve(args.host, args.port, args.backlog))
+    except KeyboardInterrupt:
+        print('[ASYNC] Shutting down...')
@@ -7,64 +7,161 @@ Handles user data, favorites, notes, inbox
 import http.server
 import json
 from urllib.parse import urlparse, parse_qs
-import urllib.request
+
+from compression import decompress, identity_etag, negotiate, send_body
+from facets import FACET_FIELDS
+from health import HEALTH_PATH, READY_PATH, Readiness, send_probe
+from metrics import MetricsMixin, metrics, send_metrics
+from response_cache import etag_matches
+from serving import create_server, parse_args
+from upstream import UpstreamError, UpstreamProxy
+from user_store import open_user_store
 
 PORT = 3000
 DATA_SERVER_URL = 'http://localhost:3001'
 
-# In-memory storage
-user_data = {}
+CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+)
+USER_ROUTES = ('/api/user/profile', '/api/user/favorites', '/api/user/notes', '/api/user/inbox')
+# Listings that accept favorites=only, with the key each puts its rows under
+FAVORITES_ROUTES = {'/api/suppliers': 'data', '/api/dashboard/suppliers': 'suppliers'}
+# Paths with their own series in /metrics; proxied data routes included
+ROUTES = (*USER_ROUTES, '/api/user/favorites/add', '/api/user/favorites/remove', '/api/user/favorites/bulk',
+          '/api/user/notes/save', '/api/user/inbox/add', '/api/suppliers', '/api/suppliers/batch',
+          '/api/suppliers/suggest', '/api/dashboard/suppliers', '/api/dashboard/stats',
+          '/api/dashboard/suppliers/search', '/metrics', '/health', '/ready')
+
+# Favorites, notes and inbox (SQLite file unless USER_STORE=memory)
+readiness = Readiness('backend-api', stages=('data',))
+user_store = open_user_store()
+readiness.done('data')
+# Everything else is proxied to the data server
+data_server = UpstreamProxy(DATA_SERVER_URL)
+# Supplier routes need a warm data server; ask it directly, past the proxy cache and circuit breaker
+readiness.add_check('dataServer', lambda: data_server.pool.request('GET', READY_PATH).status == 200)
 
-class BackendAPIHandler(http.server.BaseHTTPRequestHandler):
+class BackendAPIHandler(MetricsMixin, http.server.BaseHTTPRequestHandler):
+    metrics_server = 'backend'
+    metrics_routes = ROUTES
+    
     def do_GET(self):
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         query = parse_qs(parsed_path.query)
         
-        # Enable CORS
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.end_headers()
+        if path == '/metrics':
+            send_metrics(self, CORS_HEADERS)
+            return
+        
+        if path in (HEALTH_PATH, READY_PATH):
+            send_probe(self, readiness, path, CORS_HEADERS)
+            return
+        
+        if path in FAVORITES_ROUTES and query.get('favorites', [''])[0] == 'only':
+            self.favorites_page(path, query)
+            return
+        
+        if path not in USER_ROUTES:
+            self.proxy_get()
+            return
         
         try:
             user_id = query.get('user_id', ['anonymous'])[0]
             
             if path == '/api/user/profile':
-                profile = user_data.get(user_id, {
-                    'favorites': [],
-                    'notes': {},
-                    'inbox': [],
-                    'preferences': {'theme': 'light'}
-                })
-                response = {'success': True, 'user': profile}
+                response = {'success': True, 'user': user_store.profile(user_id)}
             
             elif path == '/api/user/favorites':
-                favorites = user_data.get(user_id, {}).get('favorites', [])
-                response = {'success': True, 'favorites': favorites}
+                response = {'success': True, 'favorites': user_store.favorites(user_id)}
             
             elif path == '/api/user/notes':
-                notes = user_data.get(user_id, {}).get('notes', {})
-                response = {'success': True, 'notes': notes}
+                response = {'success': True, 'notes': user_store.notes(user_id)}
             
             elif path == '/api/user/inbox':
-                inbox = user_data.get(user_id, {}).get('inbox', [])
-                response = {'success': True, 'inbox': inbox}
+                response = {'success': True, 'inbox': user_store.inbox(user_id)}
             
             else:
-                # Proxy to data server
-                try:
-                    url = f"{DATA_SERVER_URL}{self.path}"
-                    with urllib.request.urlopen(url, timeout=5) as resp:
-                        response = json.loads(resp.read().decode())
-                except:
-                    response = {'success': False, 'error': 'Data server unavailable'}
+                response = {'success': False, 'error': 'Not found'}
         
         except Exception as e:
+            metrics.mark_error()
             response = {'success': False, 'error': str(e)}
         
-        self.wfile.write(json.dumps(response).encode())
+        send_body(self, json.dumps(response).encode(), headers=CORS_HEADERS)
+    
+    def favorites_page(self, path, query):
+        """
+        favorites=only listing. The data server knows nothing of users, so the
+        favorite ids are resolved here and fetched with one batch lookup.
+        """
+        if any(query.get(name) for name in (*FACET_FIELDS, 'sort', 'cursor')):
+            response = {'success': False, 'error': 'favorites=only cannot be combined with filters or sorting'}
+            send_body(self, json.dumps(response).encode(), headers=CORS_HEADERS, status=400)
+            return
+        try:
+            user_id = query.get('user_id', ['anonymous'])[0]
+            skip = int(query.get('skip', ['0'])[0])
+            limit = int(query.get('limit', ['5000'])[0])
+            if skip < 0 or limit < 0:
+                raise ValueError('skip and limit must be non-negative')
+            lookup = {'ids': user_store.favorites(user_id), 'fields': query.get('fields')}
+            status, headers, body = data_server.post('/api/suppliers/batch', json.dumps(lookup).encode())
+            coding = dict(headers).get('Content-Encoding')
+            batch = json.loads(decompress(body, coding) if coding else body)
+            if batch.get('success'):
+                rows = batch['data']
+                response = {'success': True, FAVORITES_ROUTES[path]: rows[skip:skip + limit], 'total': len(rows)}
+            else:
+                response = batch
+        except UpstreamError as e:
+            self.log_message('Data server request failed: %s', e)
+            metrics.mark_error()
+            response = {'success': False, 'error': 'Data server unavailable'}
+        except Exception as e:
+            metrics.mark_error()
+            response = {'success': False, 'error': str(e)}
+        send_body(self, json.dumps(response).encode(), headers=CORS_HEADERS)
+    
+    def proxy_get(self):
+        self.relay(lambda: data_server.get(self.path))
+    
+    def proxy_post(self, body):
+        content_type = self.headers.get('Content-Type', 'application/json')
+        self.relay(lambda: data_server.post(self.path, body, content_type))
+    
+    def relay(self, call):
+        """Relay the data server response call() returns, decompressing it for clients that do not accept gzip"""
+        try:
+            status, headers, body = call()
+        except UpstreamError as e:
+            self.log_message('Data server request failed: %s', e)
+            metrics.mark_error()
+            status = 200
+            headers = [('Content-Type', 'application/json')]
+            body = json.dumps({'success': False, 'error': 'Data server unavailable'}).encode()
+        headers = dict(headers)
+        coding = headers.get('Content-Encoding')
+        if coding is not None and negotiate(self.headers.get('Accept-Encoding'), (coding,)) is None:
+            body = decompress(body, coding)
+            del headers['Content-Encoding']
+            if 'ETag' in headers:
+                headers['ETag'] = identity_etag(headers['ETag'])
+        etag = headers.get('ETag')
+        if status == 200 and etag and etag_matches(self.headers.get('If-None-Match'), etag):
+            status, body = 304, b''
+            headers = {'ETag': etag}
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Vary', 'Accept-Encoding')
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.end_headers()
+        self.wfile.write(body)
     
     def do_POST(self):
         parsed_path = urlparse(self.path)
@@ -73,6 +170,10 @@ class BackendAPIHandler(http.server.BaseHTTPRequestHandler):
         content_length = int(self.headers.get('Content-Length', 0))
         body = self.rfile.read(content_length)
         
+        if path == '/api/suppliers/batch':
+            self.proxy_post(body)
+            return
+        
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -82,40 +183,35 @@ class BackendAPIHandler(http.server.BaseHTTPRequestHandler):
             data = json.loads(body.decode()) if body else {}
             user_id = data.get('user_id', 'anonymous')
             
-            if user_id not in user_data:
-                user_data[user_id] = {'favorites': [], 'notes': {}, 'inbox': []}
-            
             if path == '/api/user/favorites/add':
-                supplier_id = data.get('supplier_id')
-                if supplier_id not in user_data[user_id]['favorites']:
-                    user_data[user_id]['favorites'].append(supplier_id)
+                user_store.add_favorite(user_id, data.get('supplier_id'))
                 response = {'success': True, 'message': 'Added to favorites'}
             
             elif path == '/api/user/favorites/remove':
-                supplier_id = data.get('supplier_id')
-                user_data[user_id]['favorites'] = [s for s in user_data[user_id]['favorites'] if s != supplier_id]
+                user_store.remove_favorite(user_id, data.get('supplier_id'))
                 response = {'success': True, 'message': 'Removed from favorites'}
             
+            elif path == '/api/user/favorites/bulk':
+                add = data.get('add', [])
+                remove = data.get('remove', [])
+                if not isinstance(add, list) or not isinstance(remove, list):
+                    raise ValueError('add and remove must be lists of supplier ids')
+                user_store.update_favorites(user_id, add, remove)
+                response = {'success': True, 'message': 'Favorites updated', 'count': len(user_store.favorites(user_id))}
+            
             elif path == '/api/user/notes/save':
-                supplier_id = data.get('supplier_id')
-                note_text = data.get('note_text', '')
-                user_data[user_id]['notes'][supplier_id] = note_text
+                user_store.save_note(user_id, data.get('supplier_id'), data.get('note_text', ''))
                 response = {'success': True, 'message': 'Note saved'}
             
             elif path == '/api/user/inbox/add':
-                message = data.get('message')
-                user_data[user_id]['inbox'].append({
-                    'id': len(user_data[user_id]['inbox']) + 1,
-                    'message': message,
-                    'timestamp': 'just now',
-                    'read': False
-                })
+                user_store.add_message(user_id, data.get('message'))
                 response = {'success': True, 'message': 'Message added'}
             
             else:
                 response = {'success': False, 'error': 'Not found'}
         
         except Exception as e:
+            metrics.mark_error()
             response = {'success': False, 'error': str(e)}
         
         self.wfile.write(json.dumps(response).encode())
@@ -131,8 +227,10 @@ class BackendAPIHandler(http.server.BaseHTTPRequestHandler):
         print(f'[BACKEND API] {format % args}')
 
 if __name__ == '__main__':
-    server = http.server.HTTPServer(('localhost', PORT), BackendAPIHandler)
+    args = parse_args('Backend API - user data and data server proxy')
+    server = create_server(('localhost', PORT), BackendAPIHandler, args)
     print(f'[BACKEND API] Running on http://localhost:{PORT}')
+    print(f'[BACKEND API] Serving with {args.workers} workers')
     try:
         server.serve_forever()
     except KeyboardInterrupt:
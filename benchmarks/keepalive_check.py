@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Keep-Alive Check - Direct data server clients are not starved by idle connections
+Starts the data server and the backend, fills the backend's upstream pool
+with a burst of proxied requests, then times a direct data server GET;
+it must not queue behind the pool's idle keep-alive connections. A second
+round holds more idle connections than the data server has workers and
+checks they are closed after --keep-alive-timeout rather than the 30 s
+request timeout. Exits 1 on failure.
+
+    python benchmarks/keepalive_check.py
+"""
+
+import http.client
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from load_test import HOST, TARGETS, Servers
+from serving import DEFAULT_KEEP_ALIVE_TIMEOUT, DEFAULT_WORKERS
+
+DATA_PORT = 3001
+BACKEND_PORT = 3000
+BURST = 16
+# A direct request should only ever wait for real work, never for an idle connection
+MAX_DIRECT_WAIT = 2.0
+
+def get(port, path, timeout=60.0):
+    connection = http.client.HTTPConnection(HOST, port, timeout=timeout)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+def timed_get(port, path):
+    start = time.perf_counter()
+    status = get(port, path)
+    return status, time.perf_counter() - start
+
+def check(name, status, elapsed, limit):
+    ok = status == 200 and elapsed <= limit
+    print(f'[CHECK] {"ok  " if ok else "FAIL"} {name}: {status} in {elapsed:.2f}s (limit {limit:g}s)')
+    return ok
+
+def main():
+    results = []
+    with tempfile.TemporaryDirectory() as scratch, \
+            Servers(TARGETS['backend'], [], str(Path(scratch) / 'users.db')):
+        # Distinct queries, so the proxy cannot coalesce them into one upstream call
+        burst = [threading.Thread(target=get, args=(BACKEND_PORT, f'/api/suppliers?skip={i}&limit=10'))
+                 for i in range(BURST)]
+        for thread in burst:
+            thread.start()
+        for thread in burst:
+            thread.join()
+        status, elapsed = timed_get(DATA_PORT, '/api/dashboard/stats?check=pool')
+        results.append(check('direct GET after filling the upstream pool', status, elapsed, MAX_DIRECT_WAIT))
+
+        # Idle keep-alive connections beyond the worker count, as an oversized pool would hold
+        idle = []
+        for i in range(DEFAULT_WORKERS * 2):
+            connection = http.client.HTTPConnection(HOST, DATA_PORT, timeout=60)
+            connection.request('GET', f'/api/suppliers?skip={i}&limit=1')
+            connection.getresponse().read()
+            idle.append(connection)
+        status, elapsed = timed_get(DATA_PORT, '/api/dashboard/stats?check=idle')
+        results.append(check('direct GET behind idle keep-alive connections', status, elapsed,
+                             DEFAULT_KEEP_ALIVE_TIMEOUT * 2 + MAX_DIRECT_WAIT))
+        for connection in idle:
+            connection.close()
+
+        # The data server has closed the pool's idle connections by now; reuse must recover
+        time.sleep(DEFAULT_KEEP_ALIVE_TIMEOUT + 1)
+        status, elapsed = timed_get(BACKEND_PORT, '/api/suppliers?skip=0&limit=5&check=reuse')
+        results.append(check('proxied GET after idle connections were closed', status, elapsed, MAX_DIRECT_WAIT))
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == '__main__':
+    main()
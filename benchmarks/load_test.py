@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Load Test - Drives a locally started server with a weighted route mix
+Runs either closed-loop (a fixed number of clients, each sending its next
+request as soon as the last one answers) or open-loop (requests scheduled
+at a fixed rate, with latency measured from the scheduled send time so a
+stalled server is not hidden). Reports throughput, latency percentiles
+per route and server RSS, and saves everything as JSON; --baseline
+compares against an earlier run and fails on a regression.
+
+In threads mode every keep-alive connection holds a server worker until
+it closes or idles past --keep-alive-timeout, so pass --server-args "--workers N" with N at least the client
+concurrency unless queueing behind busy workers is what is being measured.
+
+    python benchmarks/load_test.py --target data --mix read --concurrency 16
+    python benchmarks/load_test.py --target run --mix mixed --rate 500 --output run.json
+    python benchmarks/load_test.py --target run --baseline run.json
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import quote
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+HOST = '127.0.0.1'
+START_TIMEOUT = 120.0
+RSS_INTERVAL = 0.5
+REQUEST_TIMEOUT = 30.0
+
+SEARCH_TERMS = ('steel', 'plumbing', 'electrical', 'lumber', 'nextgen', 'global', 'roof', 'insul', 'plumbng')
+SUGGEST_PREFIXES = ('p', 'pl', 'st', 'ste', 'man', 'nextgen m', 'atl', 'ch')
+
+# Route name -> request factory: rng -> (method, path, JSON body or None)
+ROUTES = {
+    'suppliers': lambda rng: ('GET', f'/api/suppliers?skip={rng.randrange(0, 4950, 50)}&limit=50', None),
+    'dashboard': lambda rng: ('GET', f'/api/dashboard/suppliers?skip={rng.randrange(0, 4900, 100)}&limit=100', None),
+    'search': lambda rng: ('GET', f'/api/dashboard/suppliers/search?q={rng.choice(SEARCH_TERMS)}', None),
+    'search_ranked': lambda rng: ('GET', f'/api/dashboard/suppliers/search?q={rng.choice(SEARCH_TERMS)}&mode=ranked', None),
+    'suggest': lambda rng: ('GET', f'/api/suppliers/suggest?prefix={quote(rng.choice(SUGGEST_PREFIXES))}', None),
+    'stats': lambda rng: ('GET', '/api/dashboard/stats', None),
+    'favorite': lambda rng: ('POST', '/api/user/favorites/add',
+                             {'user_id': f'bench-{rng.randrange(100)}', 'supplier_id': rng.randint(1, 5000)}),
+    'note': lambda rng: ('POST', '/api/user/notes/save',
+                         {'user_id': f'bench-{rng.randrange(100)}', 'supplier_id': rng.randint(1, 5000),
+                          'note_text': 'benchmark note'}),
+}
+
+MIXES = {
+    'read': {'suppliers': 3, 'dashboard': 3, 'search': 2, 'stats': 2},
+    'search': {'search': 4, 'search_ranked': 4, 'suggest': 2},
+    'write': {'favorite': 1, 'note': 1},
+    'mixed': {'suppliers': 3, 'dashboard': 3, 'search': 2, 'stats': 1, 'favorite': 1, 'note': 1},
+}
+
+# Target -> scripts to start (dependencies first), the port to load and the routes it serves
+READ_ROUTES = ('suppliers', 'dashboard', 'search', 'search_ranked', 'suggest', 'stats')
+TARGETS = {
+    'data': {'scripts': ('data_server.py',), 'port': 3001, 'routes': READ_ROUTES},
+    'backend': {'scripts': ('data_server.py', 'backend_api.py'), 'port': 3000,
+                'routes': READ_ROUTES + ('favorite', 'note')},
+    'run': {'scripts': ('run_server.py',), 'port': 3002, 'routes': READ_ROUTES + ('favorite', 'note')},
+    'master': {'scripts': ('master_server.py',), 'port': 3000, 'routes': READ_ROUTES + ('favorite', 'note')},
+}
+
+def parse_mix(spec):
+    """A MIXES name or route=weight,route=weight"""
+    if spec in MIXES:
+        return dict(MIXES[spec])
+    mix = {}
+    for item in spec.split(','):
+        route, _, weight = item.partition('=')
+        route = route.strip()
+        if route not in ROUTES:
+            raise ValueError(f'unknown route {route!r}; routes: {", ".join(ROUTES)}')
+        mix[route] = float(weight or 1)
+    return mix
+
+def wait_for_port(port, process, timeout=START_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with code {process.returncode} before listening')
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'nothing listening on port {port} after {timeout:g}s')
+
+class Servers:
+    """Starts a target's scripts in their own session, so pre-forked workers stop with them"""
+
+    def __init__(self, target, server_args, user_store):
+        self.target = target
+        self.server_args = server_args
+        self.env = {**os.environ, 'USER_STORE': user_store}
+        self.processes = []
+
+    def __enter__(self):
+        ports = {'data_server.py': 3001}
+        for script in self.target['scripts']:
+            process = subprocess.Popen([sys.executable, script, *self.server_args], cwd=REPO_DIR, env=self.env,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+            self.processes.append(process)
+            wait_for_port(ports.get(script, self.target['port']), process)
+        return self
+
+    def __exit__(self, *exc):
+        for process in reversed(self.processes):
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                continue
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+
+    @property
+    def main_pid(self):
+        return self.processes[-1].pid
+
+def process_tree(pid):
+    pids = [pid]
+    for parent in pids:
+        try:
+            children = Path(f'/proc/{parent}/task/{parent}/children').read_text().split()
+        except OSError:
+            continue
+        pids.extend(int(child) for child in children)
+    return pids
+
+def rss_kib(pid):
+    """Resident set size of pid and its children in KiB; None where /proc is unavailable"""
+    total = None
+    for member in process_tree(pid):
+        try:
+            for line in Path(f'/proc/{member}/status').read_text().splitlines():
+                if line.startswith('VmRSS:'):
+                    total = (total or 0) + int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.samples = []
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            rss = rss_kib(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._done.wait(RSS_INTERVAL)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        if not self.samples:
+            return None
+        return {'peak_kib': max(self.samples), 'end_kib': self.samples[-1]}
+
+class LoadRun:
+    """
+    One measured phase. With rate set, request k is due at start + k / rate
+    and its latency counts from then; otherwise each client loops freely.
+    """
+
+    def __init__(self, port, mix, concurrency, rate=None, seed=0):
+        self.port = port
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self.concurrency = concurrency
+        self.rate = rate
+        self.seed = seed
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def _due(self, start):
+        with self._lock:
+            index = self._next
+            self._next += 1
+        return start + index / self.rate
+
+    def _client(self, number, start, deadline):
+        rng = random.Random(self.seed * 1000 + number)
+        connection = http.client.HTTPConnection(HOST, self.port, timeout=REQUEST_TIMEOUT)
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        while True:
+            if self.rate:
+                sent = self._due(start)
+                if sent >= deadline:
+                    break
+                delay = sent - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                sent = time.perf_counter()
+                if sent >= deadline:
+                    break
+            route = rng.choices(self.routes, self.weights)[0]
+            method, path, body = ROUTES[route](rng)
+            headers = {'Accept-Encoding': 'gzip'}
+            if body is not None:
+                body = json.dumps(body).encode()
+                headers['Content-Type'] = 'application/json'
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    errors[route] += 1
+                else:
+                    latencies[route].append(time.perf_counter() - sent)
+                if response.will_close:
+                    connection.close()
+            except (OSError, http.client.HTTPException):
+                errors[route] += 1
+                connection.close()
+        connection.close()
+        with self._lock:
+            for route, values in latencies.items():
+                self.latencies[route].extend(values)
+            for route, count in errors.items():
+                self.errors[route] += count
+
+    def run(self, duration):
+        start = time.perf_counter()
+        deadline = start + duration
+        clients = [threading.Thread(target=self._client, args=(number, start, deadline))
+                   for number in range(self.concurrency)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        self.elapsed = time.perf_counter() - start
+        return self
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    milliseconds = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'throughput_rps': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': milliseconds(sum(ordered) / len(ordered)) if ordered else None,
+            'p50': milliseconds(percentile(ordered, 0.50)),
+            'p95': milliseconds(percentile(ordered, 0.95)),
+            'p99': milliseconds(percentile(ordered, 0.99)),
+            'max': milliseconds(ordered[-1] if ordered else None),
+        },
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(result, baseline, tolerance):
+    """Regression messages for throughput drops or p99 rises beyond tolerance"""
+    problems = []
+    current, previous = result['summary'], baseline['summary']
+    if previous['throughput_rps'] and current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+        problems.append(f"throughput {current['throughput_rps']} rps vs baseline {previous['throughput_rps']} rps")
+    now, before = current['latency_ms']['p99'], previous['latency_ms']['p99']
+    if now is not None and before and now > before * (1 + tolerance):
+        problems.append(f'p99 {now} ms vs baseline {before} ms')
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Load Test - throughput, latency and RSS of a local server')
+    parser.add_argument('--target', choices=TARGETS, default='data', help='server to start (default: data)')
+    parser.add_argument('--mix', default='read',
+                        help=f'route mix: {", ".join(MIXES)} or route=weight,... (default: read)')
+    parser.add_argument('--concurrency', type=int, default=16, help='client threads (default: 16)')
+    parser.add_argument('--rate', type=float, help='open loop: requests per second instead of back-to-back')
+    parser.add_argument('--duration', type=float, default=10.0, help='measured seconds (default: 10)')
+    parser.add_argument('--warmup', type=float, default=2.0, help='unmeasured seconds first (default: 2)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--server-args', default='', help='extra arguments for the server, e.g. "--workers 8"')
+    parser.add_argument('--output', help='write the JSON result here as well as to stdout')
+    parser.add_argument('--baseline', help='earlier JSON result to compare with; exits 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed throughput drop / p99 rise against the baseline (default: 0.10)')
+    args = parser.parse_args()
+
+    target = TARGETS[args.target]
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    unsupported = sorted(set(mix) - set(target['routes']))
+    if unsupported:
+        parser.error(f'{args.target} does not serve: {", ".join(unsupported)}')
+
+    with tempfile.TemporaryDirectory() as scratch:
+        with Servers(target, args.server_args.split(), os.path.join(scratch, 'bench_users.db')) as servers:
+            print(f'[BENCH] {args.target} up on port {target["port"]}; warming up {args.warmup:g}s', file=sys.stderr)
+            if args.warmup > 0:
+                LoadRun(target['port'], mix, args.concurrency, args.rate, args.seed + 1).run(args.warmup)
+            sampler = RssSampler(servers.main_pid)
+            sampler.start()
+            print(f'[BENCH] measuring {args.duration:g}s', file=sys.stderr)
+            run = LoadRun(target['port'], mix, args.concurrency, args.rate, args.seed).run(args.duration)
+            rss = sampler.stop()
+
+    every = [value for values in run.latencies.values() for value in values]
+    result = {
+        'meta': {
+            'target': args.target,
+            'mix': mix,
+            'loop': 'open' if args.rate else 'closed',
+            'concurrency': args.concurrency,
+            'rate': args.rate,
+            'duration': args.duration,
+            'server_args': args.server_args,
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'summary': summarize(every, sum(run.errors.values()), run.elapsed),
+        'routes': {route: summarize(run.latencies[route], run.errors[route], run.elapsed) for route in mix},
+        'rss': rss,
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+    if args.baseline:
+        problems = compare(result, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for problem in problems:
+            print(f'[BENCH] REGRESSION: {problem}', file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Microbench - Repeatable timings of the data-path hot functions
+Each benchmark is calibrated to a loop count that makes one run last at
+least --min-time, then gets --warmup unmeasured runs and --runs measured
+ones; results are per-call times summarized as mean, stdev, median, min
+and max. --output saves them as JSON and --baseline compares against an
+earlier file, marking changes larger than the run-to-run noise and
+exiting 1 when anything got significantly slower.
+
+    python benchmarks/microbench.py --output before.json
+    python benchmarks/microbench.py --baseline before.json --filter search
+
+The *_scan benchmarks keep the original list-comprehension search, the
+three-pass stats aggregation and json.dumps of row dicts as fixed
+reference points next to the index, SupplierStats and streaming encoders
+that replaced them.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from load_test import git_revision
+
+DEFAULT_SIZES = (5000, 100000, 1000000)
+DEFAULT_RUNS = 5
+DEFAULT_WARMUP = 1
+MIN_RUN_TIME = 0.2
+# Calls slower than this already dominate any timer noise; fewer runs keep 1M generation bearable
+LONG_CALL = 2.0
+LONG_CALL_RUNS = 3
+SEARCH_QUERY = 'steel'
+
+def load_data_server():
+    # Importing builds the 5k catalog and its indexes; the banner is noise here
+    with contextlib.redirect_stdout(io.StringIO()):
+        import data_server
+    return data_server
+
+def size_label(size):
+    if size >= 1000000 and size % 1000000 == 0:
+        return f'{size // 1000000}M'
+    if size >= 1000 and size % 1000 == 0:
+        return f'{size // 1000}k'
+    return str(size)
+
+def benchmarks(sizes, data_size):
+    """(name, zero-argument callable) pairs; data sets are built before anything is timed"""
+    data_server = load_data_server()
+    from json_stream import RowPage, iter_json
+    from search_index import SearchIndex
+    from supplier_stats import SupplierStats
+
+    for size in sizes:
+        yield f'generate_suppliers[{size_label(size)}]', lambda size=size: data_server.generate_suppliers(size)
+
+    store = data_server.generate_suppliers(data_size)
+    records = list(store)
+    search_index = SearchIndex(store)
+    label = size_label(data_size)
+
+    def search_scan():
+        query = SEARCH_QUERY.lower()
+        return [s for s in records if query in s['name'].lower() or query in s['category'].lower()]
+
+    def stats_scan():
+        categories = len(set(s['category'] for s in records))
+        avg_rating = sum(s['rating'] for s in records) / len(records)
+        verified = sum(1 for s in records if s['walmartVerified'])
+        return categories, avg_rating, verified
+
+    stats = SupplierStats(store)
+    changed = store[0]
+
+    def stats_snapshot():
+        # What a stats request costs right after a data change, made
+        # through the same listener call SupplierStore.update makes
+        stats.row_changed(0, changed, changed)
+        return stats.snapshot()
+
+    page = {'success': True, 'suppliers': records, 'total': len(records)}
+    row_page = {'success': True, 'suppliers': RowPage(store, range(len(store))), 'total': len(store)}
+
+    yield f'search_scan[{label}]', search_scan
+    yield f'search_index[{label}]', lambda: search_index.search(SEARCH_QUERY)
+    yield f'search_ranked[{label}]', lambda: search_index.search_ranked(SEARCH_QUERY, 20)
+    yield f'stats_scan[{label}]', stats_scan
+    yield f'stats_build[{label}]', lambda: SupplierStats(store)
+    yield f'stats_snapshot[{label}]', stats_snapshot
+    yield f'json_dumps_page[{label}]', lambda: json.dumps(page).encode()
+    yield f'json_stream_page[{label}]', lambda: b''.join(iter_json(row_page))
+
+def time_loops(func, loops):
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return time.perf_counter() - start
+
+def measure(func, runs, warmup, min_time):
+    """Per-call seconds of each measured run, plus the loop count used"""
+    single = time_loops(func, 1)
+    loops = max(1, math.ceil(min_time / single)) if single > 0 else 1000
+    if single >= LONG_CALL:
+        # The calibration call doubles as the warmup
+        runs, warmup = min(runs, LONG_CALL_RUNS), 0
+    for _ in range(warmup):
+        time_loops(func, loops)
+    return [time_loops(func, loops) / loops for _ in range(runs)], loops
+
+def summarize(values, loops):
+    return {
+        'runs': len(values),
+        'loops': loops,
+        'mean': statistics.fmean(values),
+        'stdev': statistics.stdev(values) if len(values) > 1 else 0.0,
+        'median': statistics.median(values),
+        'min': min(values),
+        'max': max(values),
+        'values': values,
+    }
+
+def format_time(seconds):
+    for unit, scale in (('s', 1.0), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.3g} {unit}'
+    return f'{seconds / 1e-9:.3g} ns'
+
+def compare(current, baseline, threshold):
+    """
+    (name, baseline median, current median, change, verdict) for shared
+    benchmarks. A change counts only when it exceeds both threshold and
+    twice the larger relative stdev of the two results.
+    """
+    rows = []
+    for name, result in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        change = result['median'] / before['median'] - 1
+        noise = 2 * max(result['stdev'] / result['mean'], before['stdev'] / before['mean'])
+        if abs(change) <= max(threshold, noise):
+            verdict = 'same'
+        else:
+            verdict = 'slower' if change > 0 else 'faster'
+        rows.append((name, before['median'], result['median'], change, verdict))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbench - hot-path timings with baseline comparison')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='generate_suppliers sizes, comma separated (default: 5000,100000,1000000)')
+    parser.add_argument('--data-size', type=int, default=5000,
+                        help='catalog size for the search, stats and JSON benchmarks (default: 5000)')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help=f'measured runs (default: {DEFAULT_RUNS})')
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP,
+                        help=f'unmeasured runs first (default: {DEFAULT_WARMUP})')
+    parser.add_argument('--min-time', type=float, default=MIN_RUN_TIME,
+                        help=f'minimum seconds per run, reached by looping (default: {MIN_RUN_TIME:g})')
+    parser.add_argument('--filter', help='only benchmarks whose name contains this text')
+    parser.add_argument('--output', help='write the JSON results here')
+    parser.add_argument('--baseline', help='earlier JSON results to compare with; exits 1 if anything is slower')
+    parser.add_argument('--threshold', type=float, default=0.05,
+                        help='smallest relative change reported against the baseline (default: 0.05)')
+    args = parser.parse_args()
+    if args.runs < 1:
+        parser.error('--runs must be at least 1')
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    results = {}
+    for name, func in benchmarks(sizes, args.data_size):
+        if args.filter and args.filter not in name:
+            continue
+        values, loops = measure(func, args.runs, args.warmup, args.min_time)
+        result = results[name] = summarize(values, loops)
+        print(f'[BENCH] {name:32} {format_time(result["median"]):>10} median  '
+              f'+- {result["stdev"] / result["mean"]:6.1%}  ({result["runs"]} runs x {loops} loops)', file=sys.stderr)
+
+    output = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'data_size': args.data_size,
+        },
+        'benchmarks': results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(output, indent=2) + '\n')
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())['benchmarks']
+        rows = compare(results, baseline, args.threshold)
+        print(f'\n{"benchmark":32} {"baseline":>10} {"current":>10} {"change":>8}  verdict')
+        for name, before, after, change, verdict in rows:
+            print(f'{name:32} {format_time(before):>10} {format_time(after):>10} {change:>+8.1%}  {verdict}')
+        if any(verdict == 'slower' for *_, verdict in rows):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
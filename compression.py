@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Compression - Accept-Encoding negotiation and compressed response bodies
+gzip is always available and brotli is used when the optional brotli
+package is installed. Bodies under MIN_COMPRESS_BYTES or of types that do
+not compress (images, archives) are sent as they are
+"""
+
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Static files are compressed once per version, so they get the slow, small settings
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+STREAM_ENCODINGS = ('gzip',)
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+def is_compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+def negotiate(accept_encoding, available=ENCODINGS):
+    """Preferred coding from an Accept-Encoding header, or None for identity"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        weight = 1.0
+        name, _, value = params.strip().partition('=')
+        if name.strip() == 'q':
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for coding in available:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+def decompress(body, coding):
+    return brotli.decompress(body) if coding == 'br' else gzip.decompress(body)
+
+def compress(body, coding, static=False):
+    if coding == 'br':
+        return brotli.compress(body, quality=STATIC_BROTLI_QUALITY if static else BROTLI_QUALITY)
+    # mtime=0 keeps the output, and so its ETag, stable across restarts
+    return gzip.compress(body, compresslevel=STATIC_GZIP_LEVEL if static else GZIP_LEVEL, mtime=0)
+
+def compress_chunks(chunks, coding):
+    """gzip a stream of byte chunks incrementally"""
+    if coding != 'gzip':
+        raise ValueError(f'cannot stream {coding}')
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def variant_etag(etag, coding):
+    """Distinct strong ETag per encoding, as the bytes differ"""
+    return f'{etag[:-1]}-{coding}"' if coding else etag
+
+def variant(variants, body, coding):
+    """Compressed body from a per-entry variants dict, compressing on first use"""
+    data = variants.get(coding)
+    if data is None:
+        data = variants[coding] = compress(body, coding)
+    return data
+
+def identity_etag(etag):
+    """Undo variant_etag, for a body that was decompressed again"""
+    for coding in ENCODINGS:
+        if etag.endswith(f'-{coding}"'):
+            return etag[:-len(coding) - 2] + '"'
+    return etag
+
+def send_body(handler, body, content_type='application/json', headers=(), status=200):
+    """Write a complete body, compressed when it is large enough and the client accepts it"""
+    coding = None
+    if len(body) >= MIN_COMPRESS_BYTES and is_compressible(content_type):
+        coding = negotiate(handler.headers.get('Accept-Encoding'))
+        if coding is not None:
+            body = compress(body, coding)
+    handler.send_response(status)
+    handler.send_header('Content-Type', content_type)
+    if coding is not None:
+        handler.send_header('Content-Encoding', coding)
+    handler.send_header('Content-Length', str(len(body)))
+    handler.send_header('Vary', 'Accept-Encoding')
+    for name, value in headers:
+        handler.send_header(name, value)
+    handler.end_headers()
+    handler.wfile.write(body)
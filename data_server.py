@@ -7,15 +7,48 @@ Provides supplier data via REST API
 import http.server
 import json
 import math
+import operator
+from itertools import repeat
 from urllib.parse import urlparse, parse_qs
 
+from compression import send_body
+from health import HEALTH_PATH, READY_PATH, Readiness, send_probe, start_warmup, warm_cache
+from json_stream import json_default
+from metrics import MetricsMixin, metrics, send_metrics
+from profiler import PROFILE_PATH, ProfilingMixin, install_signal_handler, send_profile
+from response_cache import ResponseCache, cache_key, respond_cached
+from serving import KeepAliveMixin, create_server, parse_args
+from supplier_api import SupplierAPI
+from supplier_store import SupplierStore, INT, FLOAT, BOOL, TEXT, CATEGORY, CATEGORY_LIST
+
 PORT = 3001
+CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+)
+ROUTES = ('/api/suppliers', '/api/suppliers/batch', '/api/suppliers/suggest', '/api/dashboard/suppliers',
+          '/api/dashboard/stats', '/api/dashboard/suppliers/search', '/metrics', '/health', '/ready')
 
 # Seeded random generator
 def seeded_random(seed):
     x = math.sin(seed) * 10000
     return x - math.floor(x)
 
+def seeded_random_range(start, count):
+    """seeded_random for every seed in range(start, start + count) in one batch"""
+    x = list(map(operator.mul, map(math.sin, range(start, start + count)), repeat(10000)))
+    return list(map(operator.sub, x, map(math.floor, x)))
+
+SUPPLIER_SCHEMA = (
+    ('id', INT), ('name', TEXT), ('category', CATEGORY), ('rating', FLOAT),
+    ('aiScore', INT), ('location', CATEGORY), ('region', CATEGORY),
+    ('yearsInBusiness', INT), ('employees', INT), ('projectsCompleted', INT),
+    ('responseTime', CATEGORY), ('address', CATEGORY), ('city', CATEGORY),
+    ('walmartVerified', BOOL), ('size', CATEGORY), ('priceRange', CATEGORY),
+    ('minOrder', CATEGORY), ('paymentTerms', CATEGORY), ('description', CATEGORY),
+    ('products', CATEGORY_LIST),
+)
+
 def generate_suppliers(count=5000):
     """Generate supplier data with seeded random"""
     names = [
@@ -38,102 +71,127 @@ def generate_suppliers(count=5000):
     regions = ['Northeast', 'Southeast', 'Midwest', 'Southwest', 'West']
     cities = ['New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix', 'Denver', 'Atlanta', 'Seattle']
     
-    suppliers = []
-    for i in range(count):
-        seed = 1962 + i
-        suppliers.append({
-            'id': i + 1,
-            'name': names[int(seeded_random(seed) * len(names))] + f' #{i + 1}',
-            'category': categories[int(seeded_random(seed + 100) * len(categories))],
-            'rating': round(3.5 + seeded_random(seed + 200) * 1.5, 1),
-            'aiScore': int(70 + seeded_random(seed + 300) * 30),
-            'location': cities[int(seeded_random(seed + 400) * len(cities))],
-            'region': regions[int(seeded_random(seed + 500) * len(regions))],
-            'yearsInBusiness': int(5 + seeded_random(seed + 600) * 40),
-            'employees': int(10 + seeded_random(seed + 700) * 500),
-            'projectsCompleted': int(100 + seeded_random(seed + 800) * 1000),
-            'responseTime': f"{int(1 + seeded_random(seed + 900) * 24)}h",
-            'address': f"{int(seeded_random(seed + 950) * 9000)} Main St",
-            'city': cities[int(seeded_random(seed + 400) * len(cities))],
-            'walmartVerified': seeded_random(seed + 850) > 0.3,
-            'size': ['Small (1-50)', 'Medium (51-500)', 'Large (500+)'][int(seeded_random(seed + 700) * 3)],
-            'priceRange': ['Budget ($)', 'Standard ($$)', 'Premium ($$$)', 'Enterprise ($$$$)'][int(seeded_random(seed + 750) * 4)],
-            'minOrder': f"${int(100 + seeded_random(seed + 800) * 10000)}",
-            'paymentTerms': ['Net 30', 'Net 60', 'Net 90', 'COD'][int(seeded_random(seed + 600) * 4)],
-            'description': f'Leading {categories[int(seeded_random(seed + 100) * len(categories))].lower()} provider with {int(5 + seeded_random(seed + 600) * 40)} years of experience.',
-            'products': [categories[int(seeded_random(seed + 100 + j) * len(categories))] for j in range(3)]
-        })
+    # Every field draws seeded_random(1962 + i + offset) with offsets up to
+    # 950, so one batch over the widened seed range serves all of them
+    rand = seeded_random_range(1962, count + 951)
+    
+    def field(offset):
+        return rand[offset:offset + count]
+    
+    def pick(options, offset):
+        return list(map(options.__getitem__, scaled(0, len(options), offset)))
     
-    return suppliers
+    def scaled(base, span, offset):
+        return list(map(int, map(operator.add, repeat(base), map(operator.mul, field(offset), repeat(span)))))
+    
+    category = pick(categories, 100)
+    city = pick(cities, 400)
+    years = scaled(5, 40, 600)
+    columns = {
+        'id': range(1, count + 1),
+        'name': [f'{name} #{i}' for i, name in enumerate(pick(names, 0), 1)],
+        'category': category,
+        'rating': [round(3.5 + r * 1.5, 1) for r in field(200)],
+        'aiScore': scaled(70, 30, 300),
+        'location': city,
+        'region': pick(regions, 500),
+        'yearsInBusiness': years,
+        'employees': scaled(10, 500, 700),
+        'projectsCompleted': scaled(100, 1000, 800),
+        'responseTime': [f"{int(1 + r * 24)}h" for r in field(900)],
+        'address': [f"{int(r * 9000)} Main St" for r in field(950)],
+        'city': city,
+        'walmartVerified': [r > 0.3 for r in field(850)],
+        'size': pick(['Small (1-50)', 'Medium (51-500)', 'Large (500+)'], 700),
+        'priceRange': pick(['Budget ($)', 'Standard ($$)', 'Premium ($$$)', 'Enterprise ($$$$)'], 750),
+        'minOrder': [f"${int(100 + r * 10000)}" for r in field(800)],
+        'paymentTerms': pick(['Net 30', 'Net 60', 'Net 90', 'COD'], 600),
+        'description': [f'Leading {c.lower()} provider with {y} years of experience.' for c, y in zip(category, years)],
+        'products': list(zip(category, pick(categories, 101), pick(categories, 102)))
+    }
+    
+    return SupplierStore.from_columns(SUPPLIER_SCHEMA, columns)
 
 # Cache suppliers
+readiness = Readiness('data-server')
 suppliers_cache = generate_suppliers(5000)
+readiness.done('data', suppliersLoaded=len(suppliers_cache))
+supplier_api = SupplierAPI(suppliers_cache)
+response_cache = ResponseCache()
+suppliers_cache.subscribe(response_cache)
+readiness.done('indexes')
 
-class DataServerHandler(http.server.BaseHTTPRequestHandler):
+class DataServerHandler(MetricsMixin, ProfilingMixin, KeepAliveMixin, http.server.BaseHTTPRequestHandler):
+    # Keep-alive, so the backend's proxy pool can reuse its connections;
+    # every response below sets Content-Length or closes the connection.
+    # Idle connections are closed after --keep-alive-timeout so they do
+    # not hold workers that direct clients are waiting for.
+    # Headers and body go out as separate writes, so Nagle would hold the
+    # body back for the client's delayed ACK on a reused connection
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    metrics_server = 'data'
+    metrics_routes = ROUTES
+    
     def do_GET(self):
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         query = parse_qs(parsed_path.query)
         
-        # Enable CORS
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.end_headers()
+        if path == '/metrics':
+            send_metrics(self, CORS_HEADERS)
+            return
+        
+        if path == PROFILE_PATH:
+            send_profile(self, CORS_HEADERS)
+            return
+        
+        if path in (HEALTH_PATH, READY_PATH):
+            send_probe(self, readiness, path, CORS_HEADERS)
+            return
+        
+        # Every route here is read-only supplier data, so all of it goes through the cache
+        key = cache_key(path, parsed_path.query)
+        respond_cached(self, response_cache, key, lambda: supplier_api.route(path, query), CORS_HEADERS)
+    
+    def do_POST(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length)
+        path = urlparse(self.path).path
         
         try:
-            if path == '/api/suppliers':
-                skip = int(query.get('skip', ['0'])[0])
-                limit = int(query.get('limit', ['5000'])[0])
-                data = suppliers_cache[skip:skip+limit]
-                response = {'success': True, 'data': data, 'total': len(suppliers_cache)}
-            
-            elif path == '/api/dashboard/suppliers':
-                skip = int(query.get('skip', ['0'])[0])
-                limit = int(query.get('limit', ['5000'])[0])
-                data = suppliers_cache[skip:skip+limit]
-                response = {'success': True, 'suppliers': data, 'total': len(suppliers_cache)}
-            
-            elif path == '/api/dashboard/stats':
-                categories = len(set(s['category'] for s in suppliers_cache))
-                avg_rating = sum(s['rating'] for s in suppliers_cache) / len(suppliers_cache)
-                verified = sum(1 for s in suppliers_cache if s['walmartVerified'])
-                response = {
-                    'success': True,
-                    'totalSuppliers': len(suppliers_cache),
-                    'totalCategories': categories,
-                    'avgRating': round(avg_rating, 1),
-                    'verifiedCount': verified
-                }
-            
-            elif path.startswith('/api/dashboard/suppliers/search'):
-                query_str = query.get('q', [''])[0].lower()
-                results = [s for s in suppliers_cache if query_str in s['name'].lower() or query_str in s['category'].lower()]
-                response = {'success': True, 'results': results}
-            
+            data = json.loads(body.decode()) if body else {}
+            # POST form of the batch lookup, for id lists too long for a URL
+            if path == '/api/suppliers/batch':
+                response = supplier_api.batch(data.get('ids', []), data.get('fields'))
             else:
                 response = {'success': False, 'error': 'Not found'}
-        
         except Exception as e:
+            metrics.mark_error()
             response = {'success': False, 'error': str(e)}
         
-        self.wfile.write(json.dumps(response).encode())
+        send_body(self, json.dumps(response, default=json_default).encode(), headers=CORS_HEADERS)
     
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def log_message(self, format, *args):
         print(f'[DATA SERVER] {format % args}')
 
 if __name__ == '__main__':
-    server = http.server.HTTPServer(('localhost', PORT), DataServerHandler)
+    args = parse_args('Data Server - supplier data REST API')
+    install_signal_handler()
+    server = create_server(('localhost', PORT), DataServerHandler, args)
+    # Probes are answered while the cache warms; /ready stays 503 until it is done
+    start_warmup(readiness, lambda: warm_cache(response_cache, supplier_api.route), 'DATA SERVER')
     print(f'[DATA SERVER] Running on http://localhost:{PORT}')
     print(f'[DATA SERVER] Generated {len(suppliers_cache)} suppliers')
+    print(f'[DATA SERVER] Serving with {args.workers} workers')
     try:
         server.serve_forever()
     except KeyboardInterrupt:
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Facets - Precomputed per-value bitmaps for server-side supplier filtering
+Each low-cardinality field value owns an int bitmap (bit n = row n), so
+combined filters are bitwise AND/OR and facet counts are popcounts
+"""
+
+from itertools import islice
+
+FACET_FIELDS = ('category', 'region', 'size', 'priceRange', 'paymentTerms', 'walmartVerified')
+
+# Set bit positions for every byte value, used to walk a bitmap's rows
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+
+def facet_key(value):
+    """Query-string spelling of a field value ('true'/'false' for booleans)"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+def _field_values(records, field):
+    if hasattr(records, 'schema'):
+        # Columnar store: read the one column instead of materializing rows
+        return records.values(field) if field in records.fields else ()
+    return (record.get(field) for record in records)
+
+def iter_rows(bitmap):
+    """Yield the set bit positions of a bitmap in ascending order"""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for offset, byte in enumerate(data):
+        if byte:
+            base = offset * 8
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+def rows_bitmap(rows):
+    """Bitmap with a bit set for each row position"""
+    buffer = bytearray()
+    for row in rows:
+        index = row >> 3
+        if index >= len(buffer):
+            buffer.extend(bytes(index + 1 - len(buffer)))
+        buffer[index] |= 1 << (row & 7)
+    return int.from_bytes(buffer, 'little')
+
+class FacetIndex:
+    """Per-value row bitmaps; subscribe it to the store to keep it current"""
+
+    def __init__(self, records, fields=FACET_FIELDS):
+        self.size = len(records)
+        self.all = (1 << self.size) - 1
+        self.bitmaps = {}
+        nbytes = (self.size + 7) // 8
+        for field in fields:
+            buffers = {}
+            for row, value in enumerate(_field_values(records, field)):
+                if value is None:
+                    continue
+                key = facet_key(value)
+                buffer = buffers.get(key)
+                if buffer is None:
+                    buffer = buffers[key] = bytearray(nbytes)
+                buffer[row >> 3] |= 1 << (row & 7)
+            if buffers:
+                self.bitmaps[field] = {
+                    key: int.from_bytes(buffer, 'little') for key, buffer in buffers.items()
+                }
+        self._counts = self._facet_counts({})
+
+    def add(self, record):
+        """Index the next row; rows must be added in catalog order"""
+        row = self.size
+        self.size += 1
+        self.all |= 1 << row
+        for field, values in self.bitmaps.items():
+            value = record.get(field)
+            if value is not None:
+                key = facet_key(value)
+                values[key] = values.get(key, 0) | 1 << row
+                counts = self._counts[field]
+                counts[key] = counts.get(key, 0) + 1
+        return row
+
+    def _move(self, field, row, key, sign):
+        values = self.bitmaps[field]
+        counts = self._counts[field]
+        if sign > 0:
+            values[key] = values.get(key, 0) | 1 << row
+            counts[key] = counts.get(key, 0) + 1
+            return
+        values[key] &= ~(1 << row)
+        counts[key] -= 1
+        if not values[key]:
+            # The sidebar only lists values some row still has
+            del values[key], counts[key]
+
+    # SupplierStore listener
+    def row_added(self, row, record):
+        self.add(record)
+
+    def row_changed(self, row, old, new):
+        for field in self.bitmaps:
+            if old.get(field) == new.get(field):
+                continue
+            if old.get(field) is not None:
+                self._move(field, row, facet_key(old[field]), -1)
+            if new.get(field) is not None:
+                self._move(field, row, facet_key(new[field]), 1)
+
+    def parse_filters(self, query):
+        """Pick facet filters out of a parse_qs dict; repeated params are OR'd"""
+        return {field: query[field] for field in self.bitmaps if query.get(field)}
+
+    def _field_masks(self, filters):
+        masks = {}
+        for field, keys in filters.items():
+            values = self.bitmaps.get(field, {})
+            mask = 0
+            for key in keys:
+                mask |= values.get(key, 0)
+            masks[field] = mask
+        return masks
+
+    def _facet_counts(self, masks, within=None):
+        facets = {}
+        for field, values in self.bitmaps.items():
+            # Counts for a field ignore its own selection so the sidebar
+            # still shows how many rows each alternative value would add
+            base = self.all if within is None else self.all & within
+            for other, mask in masks.items():
+                if other != field:
+                    base &= mask
+            facets[field] = {key: (bitmap & base).bit_count() for key, bitmap in values.items()}
+        return facets
+
+    def select(self, filters, within=None):
+        """
+        Return (bitmap of matching rows, facet counts for the selection).
+        within is an optional row bitmap that limits everything, counts
+        included, e.g. to one user's favorites.
+        """
+        if not filters and within is None:
+            return self.all, self._counts
+        masks = self._field_masks(filters)
+        selected = self.all if within is None else self.all & within
+        for mask in masks.values():
+            selected &= mask
+        return selected, self._facet_counts(masks, within)
+
+    def page(self, filters, skip, limit, within=None):
+        """Return (row positions for the page, total matches, facet counts)"""
+        if skip < 0 or limit < 0:
+            raise ValueError('skip and limit must be non-negative')
+        if not filters and within is None:
+            return range(skip, min(skip + limit, self.size)), self.size, self._counts
+        selected, facets = self.select(filters, within)
+        rows = list(islice(iter_rows(selected), skip, skip + limit))
+        return rows, selected.bit_count(), facets
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Frontend Server - Port 3002
-Serves the dashboard HTML and static files
+Serves the dashboard HTML and static files from memory, gzip/brotli
+compressed when accepted; browsers revalidate with ETag/Last-Modified
 """
 
 import http.server
@@ -9,17 +10,32 @@ import os
 import sys
 from pathlib import Path
 
+from health import HEALTH_PATH, READY_PATH, Readiness, send_probe
+from metrics import MetricsMixin, send_metrics
+from static_files import StaticFilesMixin, static_files
+
 PORT = 3002
 FRONTEND_DIR = Path(__file__).parent / 'frontend'
 
-class FrontendHandler(http.server.SimpleHTTPRequestHandler):
+readiness = Readiness('frontend', stages=('static',))
+
+class FrontendHandler(MetricsMixin, StaticFilesMixin, http.server.SimpleHTTPRequestHandler):
+    metrics_server = 'frontend'
+    metrics_routes = ('/metrics', '/health', '/ready')
+    metrics_default_route = 'static'
+    
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=str(FRONTEND_DIR), **kwargs)
     
+    def do_GET(self):
+        if self.path == '/metrics':
+            send_metrics(self)
+        elif self.path in (HEALTH_PATH, READY_PATH):
+            send_probe(self, readiness, self.path)
+        else:
+            super().do_GET()
+    
     def end_headers(self):
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-        self.send_header('Pragma', 'no-cache')
-        self.send_header('Expires', '0')
         self.send_header('Access-Control-Allow-Origin', '*')
         super().end_headers()
     
@@ -28,6 +44,9 @@ class FrontendHandler(http.server.SimpleHTTPRequestHandler):
 
 if __name__ == '__main__':
     os.chdir(str(FRONTEND_DIR))
+    # Load the dashboard into memory before reporting ready
+    if static_files.get(FRONTEND_DIR / 'index.html') is not None:
+        readiness.done('static')
     try:
         # Try to bind to localhost
         server = http.server.HTTPServer(('127.0.0.1', PORT), FrontendHandler)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Health - Liveness and readiness probes
+/health answers 200 whenever the process can serve a request. /ready
+answers 503 until every startup stage (data loaded, indexes built,
+response cache warmed) has been marked done and every live check passes,
+so a load balancer only routes to warm processes.
+"""
+
+import json
+import threading
+import time
+import traceback
+
+from compression import send_body
+from response_cache import cache_key, lookup
+
+HEALTH_PATH = '/health'
+READY_PATH = '/ready'
+PROBE_HEADERS = (('Cache-Control', 'no-store'),)
+# What the dashboards fetch first; warmed before a process reports ready
+WARM_ROUTES = ('/api/suppliers', '/api/dashboard/suppliers', '/api/dashboard/stats')
+
+class Readiness:
+    def __init__(self, service, stages=('data', 'indexes', 'cache')):
+        self.service = service
+        self.started = time.monotonic()
+        self._stages = dict.fromkeys(stages, False)
+        self._checks = {}
+        self.details = {}
+
+    def done(self, stage, **details):
+        """Mark a startup stage finished; details are reported by both probes"""
+        self.details.update(details)
+        self._stages[stage] = True
+
+    def add_check(self, name, check):
+        """check() -> bool runs on every /ready probe, for dependencies that can come and go"""
+        self._checks[name] = check
+
+    def checks(self):
+        results = dict(self._stages)
+        for name, check in self._checks.items():
+            try:
+                results[name] = bool(check())
+            except Exception:
+                results[name] = False
+        return results
+
+    def health(self):
+        return {'status': 'ok', 'service': self.service, 'uptime': round(time.monotonic() - self.started, 3),
+                **self.details}
+
+    def ready(self):
+        """(status code, response dict) for /ready"""
+        checks = self.checks()
+        ready = all(checks.values())
+        return (200 if ready else 503), {'ready': ready, 'service': self.service, 'checks': checks, **self.details}
+
+def warm_cache(cache, render, routes=WARM_ROUTES):
+    """Encode each route's default response into cache; render(path, query) gives the response dict"""
+    for path in routes:
+        lookup(cache, cache_key(path, ''), lambda path=path: render(path, {}))
+
+def start_warmup(readiness, warm, tag, stage='cache'):
+    """Run warm() in the background, marking stage done once it succeeds"""
+    def run():
+        start = time.perf_counter()
+        try:
+            warm()
+        except Exception:
+            print(f'[{tag}] Warming {stage} failed; staying unready')
+            traceback.print_exc()
+            return
+        readiness.done(stage)
+        print(f'[{tag}] Ready ({stage} warmed in {(time.perf_counter() - start) * 1000:.0f} ms)')
+    thread = threading.Thread(target=run, name='warmup', daemon=True)
+    thread.start()
+    return thread
+
+def probe_response(readiness, path):
+    """(status, body bytes) for a /health or /ready path"""
+    if path == HEALTH_PATH:
+        status, response = 200, readiness.health()
+    else:
+        status, response = readiness.ready()
+    return status, json.dumps(response).encode()
+
+def send_probe(handler, readiness, path, headers=()):
+    status, body = probe_response(readiness, path)
+    send_body(handler, body, headers=(*PROBE_HEADERS, *headers), status=status)
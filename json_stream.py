@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+JSON Stream - Incremental encoding for large supplier pages
+Routes hand back RowPage placeholders instead of lists of row dicts; big
+pages are then written envelope-first, a batch of rows at a time, so a
+request never holds the whole encoded page in memory
+"""
+
+import json
+
+from compression import STREAM_ENCODINGS, compress_chunks, negotiate
+
+STREAM_MIN_ROWS = 1000
+ROWS_PER_CHUNK = 200
+
+_encoder = json.JSONEncoder()
+
+def parse_fields(values, store):
+    """
+    Field projection from ?fields=a,b (repeatable) or a JSON list, checked
+    against the store schema; None when no projection was asked for
+    """
+    if not values:
+        return None
+    if isinstance(values, str):
+        values = [values]
+    fields = tuple(dict.fromkeys(field.strip() for value in values for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in store.fields]
+    if unknown:
+        raise ValueError(f'unknown fields: {", ".join(unknown)}')
+    return fields or None
+
+class RowPage:
+    """Lazy page of store rows, materialized one row at a time while encoding"""
+
+    def __init__(self, store, rows, fields=None):
+        self.store = store
+        self.rows = rows
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        row_dict = self.store.row
+        fields = self.fields
+        for row in self.rows:
+            yield row_dict(row, fields)
+
+    def encoded(self):
+        """JSON text per row from the store's compiled encoder for this field set"""
+        return map(self.store.row_encoder(self.fields), self.rows)
+
+def json_default(value):
+    """json.dumps default= hook so non-streamed responses encode RowPages as lists"""
+    if isinstance(value, RowPage):
+        return list(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def is_streamable(response):
+    return any(isinstance(value, RowPage) and len(value) >= STREAM_MIN_ROWS for value in response.values())
+
+def iter_json(response):
+    """Yield the bytes of json.dumps(response, default=json_default) piece by piece"""
+    encode = _encoder.encode
+    parts = []
+    for position, (key, value) in enumerate(response.items()):
+        parts.append(('{' if position == 0 else ', ') + encode(key) + ': ')
+        if not isinstance(value, RowPage):
+            parts.append(encode(value))
+            continue
+        parts.append('[')
+        yield ''.join(parts).encode()
+        parts = []
+        batch = []
+        separator = ''
+        for text in value.encoded():
+            batch.append(text)
+            if len(batch) == ROWS_PER_CHUNK:
+                yield (separator + ', '.join(batch)).encode()
+                batch = []
+                separator = ', '
+        if batch:
+            yield (separator + ', '.join(batch)).encode()
+        parts.append(']')
+    parts.append('}' if response else '{}')
+    yield ''.join(parts).encode()
+
+def iter_json_cached(response, cache=None, key=None, generation=None):
+    """
+    iter_json that also collects the chunks and stores them in cache under
+    key once finished, unless the cache was cleared after generation.
+    Collection stops if the page outgrows the cache's per-entry limit, so
+    memory stays bounded either way.
+    """
+    collected = [] if cache is not None and response.get('success') else None
+    size = 0
+    for chunk in iter_json(response):
+        if collected is not None:
+            size += len(chunk)
+            if size > cache.max_entry_bytes:
+                collected = None
+            else:
+                collected.append(chunk)
+        yield chunk
+    if collected is not None:
+        cache.put(key, b''.join(collected), generation)
+
+def stream_json(handler, response, headers=(), cache=None, key=None, generation=None):
+    """
+    Write a response with iter_json_cached. HTTP/1.1 clients get chunked
+    transfer encoding, HTTP/1.0 clients a close-delimited body. The stream
+    is gzipped on the fly when the client accepts it; the cached copy is
+    kept uncompressed.
+    """
+    chunked = handler.request_version == 'HTTP/1.1'
+    if chunked:
+        handler.protocol_version = 'HTTP/1.1'
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'application/json')
+    coding = negotiate(handler.headers.get('Accept-Encoding'), STREAM_ENCODINGS)
+    if coding is not None:
+        handler.send_header('Content-Encoding', coding)
+    handler.send_header('Vary', 'Accept-Encoding')
+    if chunked:
+        handler.send_header('Transfer-Encoding', 'chunked')
+    handler.send_header('Connection', 'close')
+    for name, value in headers:
+        handler.send_header(name, value)
+    handler.end_headers()
+    handler.close_connection = True
+    chunks = iter_json_cached(response, cache, key, generation)
+    if coding is not None:
+        chunks = compress_chunks(chunks, coding)
+    for chunk in chunks:
+        if chunked:
+            handler.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+        else:
+            handler.wfile.write(chunk)
+    if chunked:
+        handler.wfile.write(b'0\r\n\r\n')
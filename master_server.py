@@ -8,22 +8,53 @@ Listens on multiple ports:
 """
 
 import http.server
-import socketserver
 import threading
 import json
 import math
+import operator
+from itertools import repeat
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
 import os
 
+from compression import send_body
+from health import HEALTH_PATH, READY_PATH, Readiness, send_probe, start_warmup, warm_cache
+from json_stream import json_default
+from metrics import MetricsMixin, metrics, send_metrics
+from response_cache import ResponseCache, cache_key, respond_cached
+from prefork import serve_prefork
+from profiler import PROFILE_PATH, ProfilingMixin, install_signal_handler, send_profile
+from serving import create_server, parse_args
+from static_files import StaticFilesMixin
+from supplier_api import CACHED_ROUTES, SupplierAPI, is_cacheable
+from supplier_store import SupplierStore, INT, FLOAT, BOOL, TEXT, CATEGORY
+from user_store import open_user_store
+
 BASE_DIR = Path(__file__).parent
 FRONTEND_DIR = BASE_DIR / 'frontend'
+CORS_HEADERS = (('Access-Control-Allow-Origin', '*'),)
+
+# Paths with their own series in /metrics
+ROUTES = (*CACHED_ROUTES, '/api/suppliers/batch', '/api/user/favorites', '/api/user/notes', '/api/user/favorites/add',
+          '/api/user/favorites/remove', '/api/user/favorites/bulk', '/api/user/notes/save', '/metrics', '/health',
+          '/ready')
 
 # Seeded random generator
 def seeded_random(seed):
     x = math.sin(seed) * 10000
     return x - math.floor(x)
 
+def seeded_random_range(start, count):
+    """seeded_random for every seed in range(start, start + count) in one batch"""
+    x = list(map(operator.mul, map(math.sin, range(start, start + count)), repeat(10000)))
+    return list(map(operator.sub, x, map(math.floor, x)))
+
+SUPPLIER_SCHEMA = (
+    ('id', INT), ('name', TEXT), ('category', CATEGORY), ('rating', FLOAT),
+    ('aiScore', INT), ('location', CATEGORY), ('region', CATEGORY),
+    ('yearsInBusiness', INT), ('employees', INT), ('walmartVerified', BOOL),
+)
+
 def generate_suppliers(count=5000):
     """Generate supplier data"""
     names = [
@@ -42,89 +73,138 @@ def generate_suppliers(count=5000):
     regions = ['Northeast', 'Southeast', 'Midwest', 'Southwest', 'West']
     cities = ['New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix']
     
-    suppliers = []
-    for i in range(count):
-        seed = 1962 + i
-        suppliers.append({
-            'id': i + 1,
-            'name': names[int(seeded_random(seed) * len(names))] + f' #{i + 1}',
-            'category': categories[int(seeded_random(seed + 100) * len(categories))],
-            'rating': round(3.5 + seeded_random(seed + 200) * 1.5, 1),
-            'aiScore': int(70 + seeded_random(seed + 300) * 30),
-            'location': cities[int(seeded_random(seed + 400) * len(cities))],
-            'region': regions[int(seeded_random(seed + 500) * len(regions))],
-            'yearsInBusiness': int(5 + seeded_random(seed + 600) * 40),
-            'employees': int(10 + seeded_random(seed + 700) * 500),
-            'walmartVerified': seeded_random(seed + 850) > 0.3,
-        })
-    return suppliers
+    # Every field draws seeded_random(1962 + i + offset) with offsets up to
+    # 850, so one batch over the widened seed range serves all of them
+    rand = seeded_random_range(1962, count + 851)
+    
+    def field(offset):
+        return rand[offset:offset + count]
+    
+    def pick(options, offset):
+        return list(map(options.__getitem__, scaled(0, len(options), offset)))
+    
+    def scaled(base, span, offset):
+        return list(map(int, map(operator.add, repeat(base), map(operator.mul, field(offset), repeat(span)))))
+    
+    columns = {
+        'id': range(1, count + 1),
+        'name': [f'{name} #{i}' for i, name in enumerate(pick(names, 0), 1)],
+        'category': pick(categories, 100),
+        'rating': [round(3.5 + r * 1.5, 1) for r in field(200)],
+        'aiScore': scaled(70, 30, 300),
+        'location': pick(cities, 400),
+        'region': pick(regions, 500),
+        'yearsInBusiness': scaled(5, 40, 600),
+        'employees': scaled(10, 500, 700),
+        'walmartVerified': [r > 0.3 for r in field(850)],
+    }
+    return SupplierStore.from_columns(SUPPLIER_SCHEMA, columns)
 
 # Generate supplier data once
+readiness = Readiness('master-server')
 suppliers_cache = generate_suppliers(5000)
-user_data = {}
+readiness.done('data', suppliersLoaded=len(suppliers_cache))
+# This schema keeps the city in location
+supplier_api = SupplierAPI(suppliers_cache, ('name', 'category', 'location'))
+response_cache = ResponseCache()
+suppliers_cache.subscribe(response_cache)
+user_store = open_user_store()
+readiness.done('indexes')
 
 print(f'Generated {len(suppliers_cache)} suppliers')
 
-class MasterHandler(http.server.BaseHTTPRequestHandler):
+def favorites_mask(query):
+    """Row bitmap of the user's favorites for favorites=only, otherwise None"""
+    return supplier_api.favorites_mask(query, user_store)
+
+def api_get(path, query):
+    """Response dict for a GET API route"""
+    try:
+        # Backend API endpoints
+        if path == '/api/user/favorites':
+            user_id = query.get('user_id', ['anonymous'])[0]
+            response = {'success': True, 'favorites': user_store.favorites(user_id)}
+    
+        elif path == '/api/user/notes':
+            user_id = query.get('user_id', ['anonymous'])[0]
+            response = {'success': True, 'notes': user_store.notes(user_id)}
+    
+        # Data Server endpoints (API)
+        else:
+            response = supplier_api.route(path, query, favorites_mask(query))
+    
+    except Exception as e:
+        metrics.mark_error()
+        response = {'success': False, 'error': str(e)}
+    
+    return response
+
+def api_post(path, body):
+    """Response dict for a POST API route; body is the raw request bytes"""
+    try:
+        data = json.loads(body.decode()) if body else {}
+        user_id = data.get('user_id', 'anonymous')
+    
+        if path == '/api/suppliers/batch':
+            response = supplier_api.batch(data.get('ids', []), data.get('fields'))
+    
+        elif path == '/api/user/favorites/add':
+            user_store.add_favorite(user_id, data.get('supplier_id'))
+            response = {'success': True}
+    
+        elif path == '/api/user/favorites/remove':
+            user_store.remove_favorite(user_id, data.get('supplier_id'))
+            response = {'success': True}
+    
+        elif path == '/api/user/favorites/bulk':
+            add = data.get('add', [])
+            remove = data.get('remove', [])
+            if not isinstance(add, list) or not isinstance(remove, list):
+                raise ValueError('add and remove must be lists of supplier ids')
+            user_store.update_favorites(user_id, add, remove)
+            response = {'success': True, 'count': len(user_store.favorites(user_id))}
+    
+        elif path == '/api/user/notes/save':
+            user_store.save_note(user_id, data.get('supplier_id'), data.get('note_text', ''))
+            response = {'success': True}
+    
+        else:
+            response = {'success': False, 'error': 'Not found'}
+    
+    except Exception as e:
+        metrics.mark_error()
+        response = {'success': False, 'error': str(e)}
+    
+    return response
+
+class MasterHandler(MetricsMixin, ProfilingMixin, http.server.BaseHTTPRequestHandler):
+    metrics_server = 'api'
+    metrics_routes = ROUTES
+    
     def do_GET(self):
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         query = parse_qs(parsed_path.query)
         
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
+        if path == '/metrics':
+            send_metrics(self, CORS_HEADERS)
+            return
+        
+        if path == PROFILE_PATH:
+            send_profile(self, CORS_HEADERS)
+            return
         
-        try:
-            # Data Server endpoints (API)
-            if path == '/api/suppliers':
-                skip = int(query.get('skip', ['0'])[0])
-                limit = int(query.get('limit', ['5000'])[0])
-                data = suppliers_cache[skip:skip+limit]
-                response = {'success': True, 'data': data, 'total': len(suppliers_cache)}
-            
-            elif path == '/api/dashboard/suppliers':
-                skip = int(query.get('skip', ['0'])[0])
-                limit = int(query.get('limit', ['5000'])[0])
-                data = suppliers_cache[skip:skip+limit]
-                response = {'success': True, 'suppliers': data, 'total': len(suppliers_cache)}
-            
-            elif path == '/api/dashboard/stats':
-                categories = len(set(s['category'] for s in suppliers_cache))
-                avg_rating = sum(s['rating'] for s in suppliers_cache) / len(suppliers_cache)
-                verified = sum(1 for s in suppliers_cache if s['walmartVerified'])
-                response = {
-                    'success': True,
-                    'totalSuppliers': len(suppliers_cache),
-                    'totalCategories': categories,
-                    'avgRating': round(avg_rating, 1),
-                    'verifiedCount': verified
-                }
-            
-            elif path.startswith('/api/dashboard/suppliers/search'):
-                query_str = query.get('q', [''])[0].lower()
-                results = [s for s in suppliers_cache if query_str in s['name'].lower() or query_str in s['category'].lower()]
-                response = {'success': True, 'results': results}
-            
-            # Backend API endpoints
-            elif path == '/api/user/favorites':
-                user_id = query.get('user_id', ['anonymous'])[0]
-                favorites = user_data.get(user_id, {}).get('favorites', [])
-                response = {'success': True, 'favorites': favorites}
-            
-            elif path == '/api/user/notes':
-                user_id = query.get('user_id', ['anonymous'])[0]
-                notes = user_data.get(user_id, {}).get('notes', {})
-                response = {'success': True, 'notes': notes}
-            
-            else:
-                response = {'success': False, 'error': 'Not found'}
+        if path in (HEALTH_PATH, READY_PATH):
+            send_probe(self, readiness, path, CORS_HEADERS)
+            return
         
-        except Exception as e:
-            response = {'success': False, 'error': str(e)}
+        if is_cacheable(path, query):
+            key = cache_key(path, parsed_path.query)
+            respond_cached(self, response_cache, key, lambda: api_get(path, query), CORS_HEADERS)
+            return
         
-        self.wfile.write(json.dumps(response).encode())
+        body = json.dumps(api_get(path, query), default=json_default).encode()
+        send_body(self, body, headers=CORS_HEADERS)
     
     def do_POST(self):
         content_length = int(self.headers.get('Content-Length', 0))
@@ -132,42 +212,8 @@ class MasterHandler(http.server.BaseHTTPRequestHandler):
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        
-        try:
-            data = json.loads(body.decode()) if body else {}
-            user_id = data.get('user_id', 'anonymous')
-            
-            if user_id not in user_data:
-                user_data[user_id] = {'favorites': [], 'notes': {}, 'inbox': []}
-            
-            if path == '/api/user/favorites/add':
-                supplier_id = data.get('supplier_id')
-                if supplier_id not in user_data[user_id]['favorites']:
-                    user_data[user_id]['favorites'].append(supplier_id)
-                response = {'success': True}
-            
-            elif path == '/api/user/favorites/remove':
-                supplier_id = data.get('supplier_id')
-                user_data[user_id]['favorites'] = [s for s in user_data[user_id]['favorites'] if s != supplier_id]
-                response = {'success': True}
-            
-            elif path == '/api/user/notes/save':
-                supplier_id = data.get('supplier_id')
-                note_text = data.get('note_text', '')
-                user_data[user_id]['notes'][supplier_id] = note_text
-                response = {'success': True}
-            
-            else:
-                response = {'success': False, 'error': 'Not found'}
-        
-        except Exception as e:
-            response = {'success': False, 'error': str(e)}
-        
-        self.wfile.write(json.dumps(response).encode())
+        body = json.dumps(api_post(path, body), default=json_default).encode()
+        send_body(self, body, headers=CORS_HEADERS)
     
     def do_OPTIONS(self):
         self.send_response(200)
@@ -179,10 +225,22 @@ class MasterHandler(http.server.BaseHTTPRequestHandler):
     def log_message(self, format, *args):
         pass  # Suppress logs
 
-class FrontendHandler(http.server.SimpleHTTPRequestHandler):
+class FrontendHandler(MetricsMixin, StaticFilesMixin, http.server.SimpleHTTPRequestHandler):
+    metrics_server = 'frontend'
+    metrics_routes = ('/metrics', '/health', '/ready')
+    metrics_default_route = 'static'
+    
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=str(FRONTEND_DIR), **kwargs)
     
+    def do_GET(self):
+        if self.path == '/metrics':
+            send_metrics(self)
+        elif self.path in (HEALTH_PATH, READY_PATH):
+            send_probe(self, readiness, self.path)
+        else:
+            super().do_GET()
+    
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         super().end_headers()
@@ -190,33 +248,42 @@ class FrontendHandler(http.server.SimpleHTTPRequestHandler):
     def log_message(self, format, *args):
         pass  # Suppress logs
 
-def start_api_server():
+def start_api_server(args):
     """Start API server on port 3000 & 3001"""
     Handler = MasterHandler
-    with socketserver.TCPServer(('localhost', 3000), Handler) as httpd:
+    with create_server(('localhost', 3000), Handler, args) as httpd:
         print('[API] Server running on http://localhost:3000')
         httpd.serve_forever()
 
-def start_frontend_server():
+def start_frontend_server(args):
     """Start frontend server on port 3002"""
     os.chdir(str(FRONTEND_DIR))
     Handler = FrontendHandler
-    with socketserver.TCPServer(('localhost', 3002), Handler) as httpd:
+    with create_server(('localhost', 3002), Handler, args) as httpd:
         print('[FRONTEND] Server running on http://localhost:3002')
         httpd.serve_forever()
 
+def serve_worker(args):
+    """Run the API and frontend servers in this process"""
+    # Start API server in a thread
+    api_thread = threading.Thread(target=start_api_server, args=(args,), daemon=True)
+    api_thread.start()
+    # Each worker warms its own cache; /ready stays 503 until it is done
+    start_warmup(readiness, lambda: warm_cache(response_cache, api_get), 'MAIN')
+    
+    # Start frontend server (blocks)
+    start_frontend_server(args)
+
 if __name__ == '__main__':
+    args = parse_args('Master Server - API and frontend in one process', prefork=True)
+    # Forked workers inherit the handler; signal a worker's pid to profile it
+    install_signal_handler()
     print('\n==================================================')
     print('Walmart Supplier Portal - Master Server')
     print('==================================================')
-    print('[MAIN] Starting servers...')
-    
-    # Start API server in a thread
-    api_thread = threading.Thread(target=start_api_server, daemon=True)
-    api_thread.start()
+    print(f'[MAIN] Starting servers ({args.workers} workers each, {args.processes} processes)...')
     
-    # Start frontend server (blocks)
     try:
-        start_frontend_server()
+        serve_prefork(args.processes, lambda: serve_worker(args), 'MAIN')
     except KeyboardInterrupt:
         print('\n[MAIN] Shutting down...')
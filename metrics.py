@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Metrics - Per-route request metrics in Prometheus text format
+Each thread counts into its own shard, so recording a request takes no
+lock; /metrics sums the shards. Series are keyed by server, method and
+route, where route is a known path or a catch-all label so that query
+strings and unknown URLs cannot grow the series without bound.
+
+With --processes > 1 every worker keeps its own counts and a scrape
+reaches whichever worker the kernel picks.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from compression import send_body
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METHODS = ('GET', 'HEAD', 'POST', 'OPTIONS')
+
+class Series:
+    """Counts for one (server, method, route) in one thread's shard"""
+    __slots__ = ('in_flight', 'statuses', 'errors', 'bytes', 'duration_sum', 'buckets')
+
+    def __init__(self, bucket_count):
+        self.in_flight = 0
+        self.statuses = {}
+        self.errors = 0
+        self.bytes = 0
+        self.duration_sum = 0.0
+        self.buckets = [0] * (bucket_count + 1)
+
+class Request:
+    __slots__ = ('series', 'start', 'error')
+
+    def __init__(self, series, start):
+        self.series = series
+        self.start = start
+        self.error = False
+
+class RequestMetrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        # Shards outlive their threads, since counters never go down;
+        # the pooled servers keep a fixed set of threads
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def start(self, server, method, route, start=None):
+        """Count a request as in flight; pass the result to finish() on the same thread"""
+        shard = self._shard()
+        key = (server, method if method in METHODS else 'other', route)
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = Series(len(self.buckets))
+        series.in_flight += 1
+        request = self._local.current = Request(series, time.perf_counter() if start is None else start)
+        return request
+
+    def attach(self, request):
+        """Make request the one mark_error() marks on this thread, for work handed to another thread"""
+        self._local.current = request
+
+    def mark_error(self):
+        """Count the request running on this thread as failed even though it was answered"""
+        request = getattr(self._local, 'current', None)
+        if request is not None:
+            request.error = True
+
+    def finish(self, request, status, nbytes, error=False):
+        duration = time.perf_counter() - request.start
+        series = request.series
+        series.in_flight -= 1
+        series.statuses[status] = series.statuses.get(status, 0) + 1
+        if error or request.error or status >= 500:
+            series.errors += 1
+        series.bytes += nbytes
+        series.duration_sum += duration
+        series.buckets[bisect_left(self.buckets, duration)] += 1
+        if getattr(self._local, 'current', None) is request:
+            self._local.current = None
+
+    def collect(self):
+        """Series summed across shards: {(server, method, route): Series}"""
+        totals = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # Other threads keep counting meanwhile; copies keep iteration safe
+            for key, series in shard.copy().items():
+                total = totals.get(key)
+                if total is None:
+                    total = totals[key] = Series(len(self.buckets))
+                total.in_flight += series.in_flight
+                for status, count in series.statuses.copy().items():
+                    total.statuses[status] = total.statuses.get(status, 0) + count
+                total.errors += series.errors
+                total.bytes += series.bytes
+                total.duration_sum += series.duration_sum
+                total.buckets = [a + b for a, b in zip(total.buckets, series.buckets)]
+        return totals
+
+    def render(self):
+        """Prometheus text exposition of every series"""
+        totals = sorted(self.collect().items())
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        family('http_requests_total', 'counter', 'Requests answered, by status code.')
+        for key, series in totals:
+            for status, count in sorted(series.statuses.items()):
+                lines.append(f'http_requests_total{{{labels(key, status=status)}}} {count}')
+        family('http_request_errors_total', 'counter', 'Requests that failed with a 5xx, an exception or an error response.')
+        for key, series in totals:
+            lines.append(f'http_request_errors_total{{{labels(key)}}} {series.errors}')
+        family('http_request_duration_seconds', 'histogram', 'Time from reading the request line to the last byte written.')
+        for key, series in totals:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series.buckets):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels(key, le=bound)}}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels(key)}}} {series.duration_sum:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels(key)}}} {cumulative}')
+        family('http_response_bytes_total', 'counter', 'Bytes written to clients, headers included.')
+        for key, series in totals:
+            lines.append(f'http_response_bytes_total{{{labels(key)}}} {series.bytes}')
+        family('http_requests_in_flight', 'gauge', 'Requests being handled right now.')
+        for key, series in totals:
+            lines.append(f'http_requests_in_flight{{{labels(key)}}} {series.in_flight}')
+        return '\n'.join(lines) + '\n'
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def labels(key, **extra):
+    server, method, route = key
+    pairs = [('server', server), ('method', method), ('route', route), *extra.items()]
+    return ','.join(f'{name}="{escape(value)}"' for name, value in pairs)
+
+metrics = RequestMetrics()
+
+def route_label(path, routes, default='other'):
+    """path when it is one of routes, else default"""
+    path = path.partition('?')[0]
+    return path if path in routes else default
+
+def send_metrics(handler, headers=()):
+    send_body(handler, metrics.render().encode(), CONTENT_TYPE, headers)
+
+class CountingWriter:
+    """Wraps a handler's wfile, counting the bytes written through it"""
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return self._wfile.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._wfile, name)
+
+class MetricsMixin:
+    """
+    BaseHTTPRequestHandler mixin recording every request in metrics.
+    Set metrics_server to name the server and metrics_routes to the paths
+    that get their own series; anything else is counted under
+    metrics_default_route.
+    """
+    metrics_server = 'http'
+    metrics_routes = ()
+    metrics_default_route = 'other'
+
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+
+    def parse_request(self):
+        start = time.perf_counter()
+        if not super().parse_request():
+            return False
+        route = route_label(self.path, self.metrics_routes, self.metrics_default_route)
+        self._metrics_request = metrics.start(self.metrics_server, self.command, route, start)
+        self._metrics_written = self.wfile.written
+        return True
+
+    def send_response(self, code, message=None):
+        self._metrics_status = code
+        super().send_response(code, message)
+
+    def handle_one_request(self):
+        self._metrics_request = None
+        self._metrics_status = None
+        failed = True
+        try:
+            super().handle_one_request()
+            failed = False
+        finally:
+            request = self._metrics_request
+            if request is not None:
+                # Nothing sent before an exception means the client got no answer at all
+                status = self._metrics_status or 500
+                metrics.finish(request, status, self.wfile.written - self._metrics_written, failed)
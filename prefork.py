@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Prefork - Multi-process serving under a restarting supervisor
+Workers are forked after the supplier data is loaded so they share it
+copy-on-write, and each one binds the same port with SO_REUSEPORT
+"""
+
+import gc
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import traceback
+from contextlib import suppress
+
+CAN_PREFORK = hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')
+POLL_INTERVAL = 0.5
+RESTART_DELAY = 1.0
+STOP_TIMEOUT = 5.0
+
+class ForkedWorker:
+    """Forked child running target(); mirrors the subprocess.Popen methods the supervisor uses"""
+
+    def __init__(self, target):
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                target()
+            except KeyboardInterrupt:
+                pass
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            os._exit(code)
+        self.pid = pid
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid:
+                self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() > deadline:
+                raise subprocess.TimeoutExpired(f'worker {self.pid}', timeout)
+            time.sleep(0.05)
+        return self.returncode
+
+    def terminate(self):
+        with suppress(ProcessLookupError):
+            os.kill(self.pid, signal.SIGTERM)
+
+    def kill(self):
+        with suppress(ProcessLookupError):
+            os.kill(self.pid, signal.SIGKILL)
+
+class Supervisor:
+    """Starts child processes in order and restarts any that exit until stopped"""
+
+    def __init__(self, tag='SUPERVISOR'):
+        self.tag = tag
+        self._specs = []
+        self._children = {}
+        self._stopping = False
+        self._forks = False
+
+    def add_worker(self, name, target):
+        """Fork a child that runs target()"""
+        self._forks = True
+        self._specs.append((name, lambda: ForkedWorker(target)))
+
+    def add_command(self, name, argv, **popen_kwargs):
+        """Run a separate program, e.g. another server script"""
+        self._specs.append((name, lambda: subprocess.Popen(argv, **popen_kwargs)))
+
+    def _start(self, name, spawn):
+        child = spawn()
+        self._children[name] = (child, time.monotonic())
+        print(f'[{self.tag}] {name} started (PID: {child.pid})')
+
+    def _on_sigterm(self, signum, frame):
+        self._stopping = True
+
+    def run(self):
+        if self._forks:
+            # Move everything loaded so far out of the collector's reach so
+            # GC passes in the workers don't dirty the shared pages
+            gc.collect()
+            gc.freeze()
+        signal.signal(signal.SIGTERM, self._on_sigterm)
+        try:
+            for name, spawn in self._specs:
+                self._start(name, spawn)
+            while not self._stopping:
+                time.sleep(POLL_INTERVAL)
+                for name, spawn in self._specs:
+                    child, started = self._children[name]
+                    code = child.poll()
+                    if code is None or self._stopping:
+                        continue
+                    print(f'[{self.tag}] {name} exited with code {code}, restarting')
+                    # Back off so a worker that dies at startup does not spin
+                    if time.monotonic() - started < RESTART_DELAY:
+                        time.sleep(RESTART_DELAY)
+                    self._start(name, spawn)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stopping = True
+        children = [child for child, _ in self._children.values()]
+        for child in children:
+            if child.poll() is None:
+                child.terminate()
+        for child in children:
+            try:
+                child.wait(timeout=STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                child.kill()
+        print(f'[{self.tag}] All processes stopped')
+
+def serve_prefork(processes, target, tag='PREFORK'):
+    """Run target() in supervised forked workers, or inline for a single process"""
+    if processes <= 1:
+        target()
+        return
+    if not CAN_PREFORK:
+        print(f'[{tag}] Pre-fork needs fork() and SO_REUSEPORT; running a single process')
+        target()
+        return
+    supervisor = Supervisor(tag)
+    for number in range(1, processes + 1):
+        supervisor.add_worker(f'Worker {number}', target)
+    supervisor.run()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Profiler - Opt-in profiling of a live server (set PROFILING=1)
+GET /debug/profile?seconds=N samples every thread's stack for N seconds
+and answers with collapsed stacks ("a;b;c count" lines) that
+flamegraph.pl and speedscope read directly; SIGUSR2 does the same and
+writes the result to PROFILE_DIR. A request carrying X-Debug-Profile: 1
+runs under cProfile and its stats are dumped to PROFILE_DIR.
+"""
+
+import cProfile
+import itertools
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs, urlparse
+
+from compression import send_body
+
+PROFILING = os.environ.get('PROFILING') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', tempfile.gettempdir())
+PROFILE_PATH = '/debug/profile'
+PROFILE_HEADER = 'X-Debug-Profile'
+DEFAULT_SECONDS = 10.0
+MAX_SECONDS = 60.0
+DEFAULT_INTERVAL = 0.005
+MIN_INTERVAL = 0.001
+
+# Innermost frames of threads parked waiting for work or bytes; their
+# samples are dropped unless idle=1, so busy code is not drowned out
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('thread.py', '_worker'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'accept'),
+    ('socket.py', 'readinto'),
+    ('base_events.py', '_run_once'),
+}
+
+_sampling = threading.Lock()
+_request_ids = itertools.count(1)
+
+def frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+def collapse(frame):
+    """Stack of frame as 'outermost;...;innermost'"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+def is_idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+def sample(seconds, interval=DEFAULT_INTERVAL, idle=False):
+    """
+    Counter of collapsed stacks seen across all other threads, taken every
+    interval for seconds. Raises RuntimeError if a session is already running.
+    """
+    if not _sampling.acquire(blocking=False):
+        raise RuntimeError('a profile is already being taken')
+    try:
+        own = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own and (idle or not is_idle(frame)):
+                    stacks[collapse(frame)] += 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        _sampling.release()
+
+def format_collapsed(stacks):
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+def profile_file(kind, suffix):
+    return os.path.join(PROFILE_DIR, f'{kind}-{os.getpid()}-{time.strftime("%Y%m%d-%H%M%S")}{suffix}')
+
+def send_error(handler, status, message, headers=()):
+    send_body(handler, json.dumps({'success': False, 'error': message}).encode(), headers=headers, status=status)
+
+def send_profile(handler, headers=()):
+    """Answer GET /debug/profile with collapsed stacks; blocks this worker for the whole session"""
+    if not PROFILING:
+        send_error(handler, 404, 'Profiling is disabled; start the server with PROFILING=1', headers)
+        return
+    query = parse_qs(urlparse(handler.path).query)
+    try:
+        seconds = min(float(query.get('seconds', [DEFAULT_SECONDS])[0]), MAX_SECONDS)
+        interval = max(float(query.get('interval', [DEFAULT_INTERVAL])[0]), MIN_INTERVAL)
+        stacks = sample(seconds, interval, query.get('idle', ['0'])[0] == '1')
+    except ValueError:
+        send_error(handler, 400, 'seconds and interval must be numbers', headers)
+        return
+    except RuntimeError as e:
+        send_error(handler, 409, str(e), headers)
+        return
+    send_body(handler, format_collapsed(stacks).encode(), 'text/plain; charset=utf-8', headers)
+
+def _sample_to_file(seconds):
+    try:
+        stacks = sample(seconds)
+    except RuntimeError as e:
+        print(f'[PROFILE] Skipped: {e}')
+        return
+    path = profile_file('profile', '.collapsed')
+    with open(path, 'w') as f:
+        f.write(format_collapsed(stacks))
+    print(f'[PROFILE] {sum(stacks.values())} samples over {seconds:g}s written to {path}')
+
+def install_signal_handler(seconds=DEFAULT_SECONDS):
+    """With PROFILING=1, make SIGUSR2 sample the process for seconds in the background"""
+    if not PROFILING or not hasattr(signal, 'SIGUSR2') or threading.current_thread() is not threading.main_thread():
+        return
+    signal.signal(signal.SIGUSR2, lambda signum, frame: threading.Thread(
+        target=_sample_to_file, args=(seconds,), name='profiler', daemon=True).start())
+
+class ProfilingMixin:
+    """
+    BaseHTTPRequestHandler mixin: with PROFILING=1, a request sending
+    X-Debug-Profile: 1 is run under cProfile and its stats written to
+    PROFILE_DIR, loadable with pstats or snakeviz
+    """
+
+    def parse_request(self):
+        self._profile = None
+        if not super().parse_request():
+            return False
+        if PROFILING and self.headers.get(PROFILE_HEADER) == '1':
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is already active in this interpreter
+                return True
+            self._profile = profile
+            self._profile_start = time.perf_counter()
+        return True
+
+    def handle_one_request(self):
+        self._profile = None
+        try:
+            super().handle_one_request()
+        finally:
+            profile = self._profile
+            if profile is not None:
+                profile.disable()
+                elapsed = time.perf_counter() - self._profile_start
+                path = profile_file('request', f'-{next(_request_ids)}.prof')
+                profile.dump_stats(path)
+                print(f'[PROFILE] {self.command} {self.path} took {elapsed * 1000:.1f} ms; stats written to {path}')
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Response Cache - Pre-serialized JSON responses with strong ETags
+Supplier data only changes through the store, so encoded response bytes
+are kept per normalized path + query in an LRU bounded by a byte budget.
+Compressed variants are made on first request and live with their entry
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from urllib.parse import parse_qsl, urlencode
+
+from compression import MIN_COMPRESS_BYTES, negotiate, variant, variant_etag
+from json_stream import is_streamable, iter_json, stream_json
+
+RESPONSE_CACHE_BYTES = int(os.environ.get('RESPONSE_CACHE_BYTES', 64 * 1024 * 1024))
+
+# variants maps a content coding to the compressed body; the byte budget
+# counts only the identity bodies, which the variants are smaller than
+CachedResponse = namedtuple('CachedResponse', 'body etag variants')
+
+def cache_key(path, query_string):
+    """Normalize a request so reordered query parameters share an entry"""
+    params = sorted(parse_qsl(query_string, keep_blank_values=True))
+    return f'{path}?{urlencode(params)}' if params else path
+
+def make_etag(body):
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+class ResponseCache:
+    def __init__(self, max_bytes=RESPONSE_CACHE_BYTES, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        # One oversized page should not flush everything else out of the cache
+        self.max_entry_bytes = max_bytes // 4 if max_entry_bytes is None else max_entry_bytes
+        self.size = 0
+        # Bumped by clear(), so a body rendered before a data change is not stored after it
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, generation=None):
+        """
+        Store body under key. generation is self.generation from before the
+        body was rendered; the body is only returned, not stored, if the
+        cache has been cleared since.
+        """
+        entry = CachedResponse(body, make_etag(body), {})
+        if len(body) > self.max_entry_bytes:
+            return entry
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return entry
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.body)
+            self._entries[key] = entry
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.body)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.generation += 1
+
+    # SupplierStore listener: any data change invalidates every response
+    def row_added(self, row, record):
+        self.clear()
+
+    def row_changed(self, row, old, new):
+        self.clear()
+
+def encode_entry(cache, key, response, generation=None):
+    """Serialize a rendered response, storing it only if it succeeded (see ResponseCache.put)"""
+    body = b''.join(iter_json(response))
+    if not response.get('success'):
+        return CachedResponse(body, make_etag(body), {})
+    return cache.put(key, body, generation)
+
+def lookup(cache, key, render):
+    """Cached entry for key, calling render() for the response dict on a miss"""
+    generation = cache.generation
+    entry = cache.get(key)
+    if entry is None:
+        entry = encode_entry(cache, key, render(), generation)
+    return entry
+
+def select_variant(entry, accept_encoding):
+    """(body, etag, coding) of an entry for a request's Accept-Encoding"""
+    coding = negotiate(accept_encoding) if len(entry.body) >= MIN_COMPRESS_BYTES else None
+    if coding is None:
+        return entry.body, entry.etag, None
+    return variant(entry.variants, entry.body, coding), variant_etag(entry.etag, coding), coding
+
+def respond_cached(handler, cache, key, render, headers=()):
+    """
+    Answer a GET through the cache. render() returns the response dict;
+    only successful responses are stored. A matching If-None-Match gets
+    a bodiless 304. Large pages missing from the cache are streamed
+    instead of being encoded up front. Bodies are compressed as the
+    client's Accept-Encoding allows.
+    """
+    generation = cache.generation
+    entry = cache.get(key)
+    if entry is None:
+        response = render()
+        if is_streamable(response):
+            stream_json(handler, response, headers, cache, key, generation)
+            return
+        entry = encode_entry(cache, key, response, generation)
+    body, etag, coding = select_variant(entry, handler.headers.get('Accept-Encoding'))
+    if etag_matches(handler.headers.get('If-None-Match'), etag):
+        handler.send_response(304)
+        handler.send_header('ETag', etag)
+        handler.send_header('Vary', 'Accept-Encoding')
+        for name, value in headers:
+            handler.send_header(name, value)
+        handler.end_headers()
+        return
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'application/json')
+    if coding is not None:
+        handler.send_header('Content-Encoding', coding)
+    handler.send_header('Content-Length', str(len(body)))
+    handler.send_header('ETag', etag)
+    handler.send_header('Vary', 'Accept-Encoding')
+    for name, value in headers:
+        handler.send_header(name, value)
+    handler.end_headers()
+    handler.wfile.write(body)
@@ -7,19 +7,56 @@ Listens on port 3002 only
 import http.server
 import json
 import math
+import operator
 import os
+from itertools import repeat
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
 
+from compression import send_body
+from health import HEALTH_PATH, READY_PATH, Readiness, send_probe, start_warmup, warm_cache
+from json_stream import json_default
+from metrics import MetricsMixin, metrics, send_metrics
+from response_cache import ResponseCache, cache_key, respond_cached
+from prefork import serve_prefork
+from profiler import PROFILE_PATH, ProfilingMixin, install_signal_handler, send_profile
+from serving import create_server, parse_args
+from static_files import send_static
+from supplier_api import CACHED_ROUTES, SupplierAPI, is_cacheable
+from supplier_store import SupplierStore, INT, FLOAT, BOOL, TEXT, CATEGORY
+from user_store import open_user_store
+
 # Configuration
 PORT = 3002
 FRONTEND_DIR = Path(__file__).parent / 'frontend'
+CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+)
+# Paths with their own series in /metrics
+ROUTES = (*CACHED_ROUTES, '/', '/index.html', '/api/suppliers/batch', '/api/user/favorites/add',
+          '/api/user/favorites/remove', '/api/user/favorites/bulk', '/api/user/notes/save', '/metrics', '/health',
+          '/ready')
 
 # Seeded random
 def seeded_random(seed):
     x = math.sin(seed) * 10000
     return x - math.floor(x)
 
+def seeded_random_range(start, count):
+    """seeded_random for every seed in range(start, start + count) in one batch"""
+    x = list(map(operator.mul, map(math.sin, range(start, start + count)), repeat(10000)))
+    return list(map(operator.sub, x, map(math.floor, x)))
+
+SUPPLIER_SCHEMA = (
+    ('id', INT), ('name', TEXT), ('category', CATEGORY), ('rating', FLOAT),
+    ('aiScore', INT), ('location', CATEGORY), ('region', CATEGORY),
+    ('yearsInBusiness', INT), ('employees', INT), ('projectsCompleted', INT),
+    ('responseTime', CATEGORY), ('address', CATEGORY), ('city', CATEGORY),
+    ('walmartVerified', BOOL), ('size', CATEGORY), ('priceRange', CATEGORY),
+    ('minOrder', CATEGORY), ('paymentTerms', CATEGORY), ('description', CATEGORY),
+)
+
 # Generate suppliers
 def generate_suppliers(count=5000):
     names = [
@@ -37,143 +74,144 @@ def generate_suppliers(count=5000):
     regions = ['Northeast', 'Southeast', 'Midwest', 'Southwest', 'West']
     cities = ['New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix', 'Denver', 'Atlanta', 'Seattle']
     
-    suppliers = []
-    for i in range(count):
-        seed = 1962 + i
-        suppliers.append({
-            'id': i + 1,
-            'name': names[int(seeded_random(seed) * len(names))] + f' #{i + 1}',
-            'category': categories[int(seeded_random(seed + 100) * len(categories))],
-            'rating': round(3.5 + seeded_random(seed + 200) * 1.5, 1),
-            'aiScore': int(70 + seeded_random(seed + 300) * 30),
-            'location': cities[int(seeded_random(seed + 400) * len(cities))],
-            'region': regions[int(seeded_random(seed + 500) * len(regions))],
-            'yearsInBusiness': int(5 + seeded_random(seed + 600) * 40),
-            'employees': int(10 + seeded_random(seed + 700) * 500),
-            'projectsCompleted': int(100 + seeded_random(seed + 800) * 1000),
-            'responseTime': f"{int(1 + seeded_random(seed + 900) * 24)}h",
-            'address': f"{int(seeded_random(seed + 950) * 9000)} Main St",
-            'city': cities[int(seeded_random(seed + 400) * len(cities))],
-            'walmartVerified': seeded_random(seed + 850) > 0.3,
-            'size': ['Small (1-50)', 'Medium (51-500)', 'Large (500+)'][int(seeded_random(seed + 700) * 3)],
-            'priceRange': ['Budget ($)', 'Standard ($$)', 'Premium ($$$)', 'Enterprise ($$$$)'][int(seeded_random(seed + 750) * 4)],
-            'minOrder': f"${int(100 + seeded_random(seed + 800) * 10000)}",
-            'paymentTerms': ['Net 30', 'Net 60', 'Net 90', 'COD'][int(seeded_random(seed + 600) * 4)],
-            'description': f'Leading {categories[int(seeded_random(seed + 100) * len(categories))].lower()} provider.'
-        })
-    return suppliers
+    # Every field draws seeded_random(1962 + i + offset) with offsets up to
+    # 950, so one batch over the widened seed range serves all of them
+    rand = seeded_random_range(1962, count + 951)
+    
+    def field(offset):
+        return rand[offset:offset + count]
+    
+    def pick(options, offset):
+        return list(map(options.__getitem__, scaled(0, len(options), offset)))
+    
+    def scaled(base, span, offset):
+        return list(map(int, map(operator.add, repeat(base), map(operator.mul, field(offset), repeat(span)))))
+    
+    category = pick(categories, 100)
+    city = pick(cities, 400)
+    columns = {
+        'id': range(1, count + 1),
+        'name': [f'{name} #{i}' for i, name in enumerate(pick(names, 0), 1)],
+        'category': category,
+        'rating': [round(3.5 + r * 1.5, 1) for r in field(200)],
+        'aiScore': scaled(70, 30, 300),
+        'location': city,
+        'region': pick(regions, 500),
+        'yearsInBusiness': scaled(5, 40, 600),
+        'employees': scaled(10, 500, 700),
+        'projectsCompleted': scaled(100, 1000, 800),
+        'responseTime': [f"{int(1 + r * 24)}h" for r in field(900)],
+        'address': [f"{int(r * 9000)} Main St" for r in field(950)],
+        'city': city,
+        'walmartVerified': [r > 0.3 for r in field(850)],
+        'size': pick(['Small (1-50)', 'Medium (51-500)', 'Large (500+)'], 700),
+        'priceRange': pick(['Budget ($)', 'Standard ($$)', 'Premium ($$$)', 'Enterprise ($$$$)'], 750),
+        'minOrder': [f"${int(100 + r * 10000)}" for r in field(800)],
+        'paymentTerms': pick(['Net 30', 'Net 60', 'Net 90', 'COD'], 600),
+        'description': [f'Leading {c.lower()} provider.' for c in category]
+    }
+    return SupplierStore.from_columns(SUPPLIER_SCHEMA, columns)
 
 print('[SERVER] Generating 5000 suppliers...')
+readiness = Readiness('run-server')
 suppliers_cache = generate_suppliers(5000)
-user_data = {}
+readiness.done('data', suppliersLoaded=len(suppliers_cache))
+supplier_api = SupplierAPI(suppliers_cache)
+response_cache = ResponseCache()
+suppliers_cache.subscribe(response_cache)
+user_store = open_user_store()
+readiness.done('indexes')
 print(f'[SERVER] Ready with {len(suppliers_cache)} suppliers')
 
-class UnifiedHandler(http.server.BaseHTTPRequestHandler):
+def favorites_mask(query):
+    """Row bitmap of the user's favorites for favorites=only, otherwise None"""
+    return supplier_api.favorites_mask(query, user_store)
+
+class UnifiedHandler(MetricsMixin, ProfilingMixin, http.server.BaseHTTPRequestHandler):
+    metrics_server = 'unified'
+    metrics_routes = ROUTES
+    
     def do_GET(self):
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         query = parse_qs(parsed_path.query)
         
-        # Set CORS headers
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.end_headers()
+        if path == '/metrics':
+            send_metrics(self, CORS_HEADERS)
+            return
         
-        try:
-            # API endpoints
-            if path == '/api/suppliers':
-                skip = int(query.get('skip', ['0'])[0])
-                limit = int(query.get('limit', ['5000'])[0])
-                data = suppliers_cache[skip:skip+limit]
-                response = {'success': True, 'data': data, 'total': len(suppliers_cache)}
-            
-            elif path == '/api/dashboard/suppliers':
-                skip = int(query.get('skip', ['0'])[0])
-                limit = int(query.get('limit', ['5000'])[0])
-                data = suppliers_cache[skip:skip+limit]
-                response = {'success': True, 'suppliers': data, 'total': len(suppliers_cache)}
-            
-            elif path == '/api/dashboard/stats':
-                categories = len(set(s['category'] for s in suppliers_cache))
-                avg_rating = sum(s['rating'] for s in suppliers_cache) / len(suppliers_cache)
-                verified = sum(1 for s in suppliers_cache if s['walmartVerified'])
-                response = {
-                    'success': True,
-                    'totalSuppliers': len(suppliers_cache),
-                    'totalCategories': categories,
-                    'avgRating': round(avg_rating, 1),
-                    'verifiedCount': verified
-                }
-            
-            elif path.startswith('/api/dashboard/suppliers/search'):
-                q = query.get('q', [''])[0].lower()
-                results = [s for s in suppliers_cache if q in s['name'].lower() or q in s['category'].lower()]
-                response = {'success': True, 'results': results}
-            
-            # Serve HTML file for root path
-            elif path == '/' or path == '/index.html':
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                # Serve dashboard_with_api.html instead of index.html
-                html_file = Path(__file__).parent / 'dashboard_with_api.html'
-                if html_file.exists():
-                    self.wfile.write(html_file.read_bytes())
-                else:
-                    self.wfile.write(b'<h1>dashboard_with_api.html not found</h1>')
-                return
-            
-            else:
-                response = {'success': False, 'error': 'Not found'}
+        if path == PROFILE_PATH:
+            send_profile(self, CORS_HEADERS)
+            return
         
-        except Exception as e:
-            response = {'success': False, 'error': str(e)}
+        if path in (HEALTH_PATH, READY_PATH):
+            send_probe(self, readiness, path, CORS_HEADERS)
+            return
+        
+        # Serve HTML file for root path
+        if path == '/' or path == '/index.html':
+            # Serve dashboard_with_api.html instead of index.html
+            html_file = Path(__file__).parent / 'dashboard_with_api.html'
+            if not send_static(self, html_file, CORS_HEADERS):
+                send_body(self, b'<h1>dashboard_with_api.html not found</h1>', 'text/html', CORS_HEADERS)
+            return
         
-        self.wfile.write(json.dumps(response).encode())
+        if is_cacheable(path, query):
+            key = cache_key(path, parsed_path.query)
+            respond_cached(self, response_cache, key, lambda: self.route(path, query), CORS_HEADERS)
+            return
+        
+        body = json.dumps(self.route(path, query), default=json_default).encode()
+        send_body(self, body, headers=CORS_HEADERS)
+    
+    @staticmethod
+    def route(path, query):
+        try:
+            within = favorites_mask(query)
+        except Exception as e:
+            metrics.mark_error()
+            return {'success': False, 'error': str(e)}
+        return supplier_api.route(path, query, within)
     
     def do_POST(self):
         content_length = int(self.headers.get('Content-Length', 0))
         body = self.rfile.read(content_length)
         
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        
         try:
             data = json.loads(body.decode()) if body else {}
             user_id = data.get('user_id', 'anonymous')
             
-            if user_id not in user_data:
-                user_data[user_id] = {'favorites': [], 'notes': {}, 'inbox': []}
+            if self.path == '/api/suppliers/batch':
+                response = supplier_api.batch(data.get('ids', []), data.get('fields'))
             
-            if self.path == '/api/user/favorites/add':
-                supplier_id = data.get('supplier_id')
-                if supplier_id not in user_data[user_id]['favorites']:
-                    user_data[user_id]['favorites'].append(supplier_id)
+            elif self.path == '/api/user/favorites/add':
+                user_store.add_favorite(user_id, data.get('supplier_id'))
                 response = {'success': True}
             
             elif self.path == '/api/user/favorites/remove':
-                supplier_id = data.get('supplier_id')
-                user_data[user_id]['favorites'] = [s for s in user_data[user_id]['favorites'] if s != supplier_id]
+                user_store.remove_favorite(user_id, data.get('supplier_id'))
                 response = {'success': True}
             
+            elif self.path == '/api/user/favorites/bulk':
+                add = data.get('add', [])
+                remove = data.get('remove', [])
+                if not isinstance(add, list) or not isinstance(remove, list):
+                    raise ValueError('add and remove must be lists of supplier ids')
+                user_store.update_favorites(user_id, add, remove)
+                response = {'success': True, 'count': len(user_store.favorites(user_id))}
+            
             elif self.path == '/api/user/notes/save':
-                supplier_id = data.get('supplier_id')
-                note_text = data.get('note_text', '')
-                user_data[user_id]['notes'][supplier_id] = note_text
+                user_store.save_note(user_id, data.get('supplier_id'), data.get('note_text', ''))
                 response = {'success': True}
             
             else:
                 response = {'success': False, 'error': 'Not found'}
         
         except Exception as e:
+            metrics.mark_error()
             response = {'success': False, 'error': str(e)}
         
-        self.wfile.write(json.dumps(response).encode())
+        send_body(self, json.dumps(response, default=json_default).encode(), headers=CORS_HEADERS)
     
     def do_OPTIONS(self):
         self.send_response(200)
@@ -185,17 +223,29 @@ class UnifiedHandler(http.server.BaseHTTPRequestHandler):
     def log_message(self, format, *args):
         print(f'[SERVER] {format % args}')
 
+def serve_worker(args):
+    """Bind and serve in this process (one pre-fork worker when --processes > 1)"""
+    server = create_server(('', PORT), UnifiedHandler, args)
+    start_warmup(readiness, lambda: warm_cache(response_cache, UnifiedHandler.route), 'SERVER')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
 if __name__ == '__main__':
     try:
-        server = http.server.HTTPServer(('', PORT), UnifiedHandler)
+        args = parse_args('Complete Server - API and dashboard on one port', prefork=True)
+        # Forked workers inherit the handler; signal a worker's pid to profile it
+        install_signal_handler()
         print(f'\n[SERVER] ==========================================')
         print(f'[SERVER] Server running on http://localhost:{PORT}')
         print(f'[SERVER] Open in browser: http://localhost:{PORT}')
         print(f'[SERVER] ==========================================')
+        print(f'[SERVER] Serving with {args.workers} workers x {args.processes} processes')
         print(f'[SERVER] Press Ctrl+C to stop\n')
         import sys
         sys.stdout.flush()
-        server.serve_forever()
+        serve_prefork(args.processes, lambda: serve_worker(args), 'SERVER')
     except Exception as e:
         print(f'[SERVER] FATAL ERROR: {e}')
         import traceback
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Search Index - Inverted token and n-gram index over supplier records
+Built once at startup so searches intersect posting lists instead of
+lowercasing and scanning every supplier on every request. search_ranked
+scores rows with BM25 over the token postings, blended with rating and
+aiScore, and expands query words to prefixes and near-miss spellings
+"""
+
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+SEARCH_FIELDS = ('name', 'category', 'description', 'products')
+NGRAM_SIZE = 3
+
+# A hit in a name counts for more than one in a description
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'products': 1.5, 'description': 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+# How much an expanded token counts next to the query word itself
+PREFIX_WEIGHT = 0.75
+FUZZY_WEIGHT = 0.5
+# Final score: normalized text relevance plus quality boosts (field, scale, weight)
+TEXT_WEIGHT = 0.7
+QUALITY_BOOSTS = (('rating', 5.0, 0.15), ('aiScore', 100.0, 0.15))
+RANKED_LIMIT = 20
+MAX_RANKED_LIMIT = 100
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+def _ngrams(text, size=NGRAM_SIZE):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def max_edits(word):
+    """Typos tolerated for a query word: none for short words, more for long ones"""
+    if len(word) < 4:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+def _char_mask(token):
+    mask = 0
+    for char in set(token):
+        mask |= 1 << ord(char)
+    return mask
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance of a and b, or limit + 1 once it must exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def _intersect(small, large):
+    """Intersect two ascending posting lists, probing the larger one"""
+    result = []
+    lo, end = 0, len(large)
+    for item in small:
+        lo = bisect_left(large, item, lo)
+        if lo == end:
+            break
+        if large[lo] == item:
+            result.append(item)
+    return result
+
+class SearchIndex:
+    """
+    Two-level index: every distinct lowercased field value is stored once
+    and n-grams map to value ids, for substring search. Each (field, value)
+    pair is an entry mapping to the rows that hold the value in that field,
+    and tokens map to entry ids, so BM25 weighs a hit by the field it is in.
+    Low-cardinality text (categories, descriptions, products) is therefore
+    indexed once per field no matter how many suppliers share it. Subscribe
+    it to the store to keep it current.
+    """
+
+    def __init__(self, records, fields=SEARCH_FIELDS):
+        self.fields = tuple(fields)
+        self.size = 0
+        self._values = []       # value id -> lowercased field value
+        self._value_ids = {}    # lowercased field value -> value id
+        self._value_entries = []    # value id -> ids of the entries holding it
+        self._grams = {}        # n-gram -> ascending value ids
+        self._entry_ids = {}    # (field, value id) -> entry id
+        self._entry_rows = []   # entry id -> ascending row positions
+        self._entry_weights = array('f')    # entry id -> weight of its field
+        self._tokens = {}       # token -> ascending entry ids
+        self._token_counts = {} # token -> occurrences in each of its entries' value
+        self._lengths = array('I')  # row -> token count, the BM25 document length
+        self._total_length = 0
+        self._records = records
+        self._vocabulary = None
+        self._by_length = None
+        for record in records:
+            self.add(record)
+
+    def _texts(self, record):
+        for field in self.fields:
+            value = record.get(field)
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                for item in value:
+                    yield field, str(item).lower()
+            else:
+                yield field, str(value).lower()
+
+    def _intern(self, text):
+        value_id = self._value_ids.get(text)
+        if value_id is None:
+            value_id = len(self._values)
+            self._values.append(text)
+            self._value_ids[text] = value_id
+            self._value_entries.append([])
+            for gram in _ngrams(text):
+                self._grams.setdefault(gram, array('I')).append(value_id)
+        return value_id
+
+    def _entry(self, field, text):
+        value_id = self._intern(text)
+        entry_id = self._entry_ids.get((field, value_id))
+        if entry_id is None:
+            entry_id = self._entry_ids[field, value_id] = len(self._entry_rows)
+            self._entry_rows.append(array('I'))
+            self._entry_weights.append(FIELD_WEIGHTS.get(field, 1.0))
+            self._value_entries[value_id].append(entry_id)
+            for token, count in Counter(_TOKEN_RE.findall(text)).items():
+                self._tokens.setdefault(token, array('I')).append(entry_id)
+                self._token_counts.setdefault(token, array('H')).append(min(count, 0xFFFF))
+            self._vocabulary = None
+            self._by_length = None
+        return entry_id
+
+    def _index_row(self, row, texts):
+        """Add row to the postings of texts, returning its BM25 length"""
+        length = 0
+        for field, text in texts:
+            rows = self._entry_rows[self._entry(field, text)]
+            if not rows or rows[-1] < row:
+                rows.append(row)
+            else:
+                position = bisect_left(rows, row)
+                if rows[position] != row:
+                    rows.insert(position, row)
+            length += len(_TOKEN_RE.findall(text))
+        return length
+
+    def add(self, record):
+        """Index the next row; rows must be added in catalog order"""
+        row = self.size
+        length = self._index_row(row, self._texts(record))
+        self._lengths.append(length)
+        self._total_length += length
+        self.size += 1
+        return row
+
+    def _old_entries(self, texts):
+        entry_ids = set()
+        for field, text in texts:
+            value_id = self._value_ids.get(text)
+            entry_id = self._entry_ids.get((field, value_id))
+            if entry_id is not None:
+                entry_ids.add(entry_id)
+        return entry_ids
+
+    # SupplierStore listener
+    def row_added(self, row, record):
+        self.add(record)
+
+    def row_changed(self, row, old, new):
+        old_texts = list(self._texts(old))
+        new_texts = list(self._texts(new))
+        if old_texts == new_texts:
+            return
+        for entry_id in self._old_entries(old_texts):
+            rows = self._entry_rows[entry_id]
+            position = bisect_left(rows, row)
+            if position < len(rows) and rows[position] == row:
+                del rows[position]
+        length = self._index_row(row, new_texts)
+        self._total_length += length - self._lengths[row]
+        self._lengths[row] = length
+
+    @property
+    def vocabulary(self):
+        """Sorted token list, rebuilt lazily after new values are interned"""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._tokens)
+        return self._vocabulary
+
+    def _tokens_near(self, word, limit):
+        """Vocabulary tokens within limit edits of word, with their distance"""
+        if self._by_length is None:
+            by_length = {}
+            for token in self.vocabulary:
+                by_length.setdefault(len(token), []).append((token, _char_mask(token)))
+            self._by_length = by_length
+        mask = _char_mask(word)
+        for length in range(len(word) - limit, len(word) + limit + 1):
+            for token, token_mask in self._by_length.get(length, ()):
+                # Each edit brings in or drops at most one distinct character,
+                # which rules out most tokens without running the DP
+                if (mask & ~token_mask).bit_count() > limit or (token_mask & ~mask).bit_count() > limit:
+                    continue
+                distance = edit_distance(word, token, limit)
+                if distance <= limit:
+                    yield token, distance
+
+    def _rows(self, entry_ids):
+        if len(entry_ids) == 1:
+            return list(self._entry_rows[entry_ids[0]])
+        rows = set()
+        for entry_id in entry_ids:
+            rows.update(self._entry_rows[entry_id])
+        return sorted(rows)
+
+    def _substring_entries(self, needle):
+        entries = self._value_entries
+        return [entry_id for value_id in self._substring_values(needle) for entry_id in entries[value_id]]
+
+    def _substring_values(self, needle):
+        values = self._values
+        if len(needle) < NGRAM_SIZE:
+            return [value_id for value_id, value in enumerate(values) if needle in value]
+        postings = []
+        for gram in _ngrams(needle):
+            posting = self._grams.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            candidates = _intersect(candidates, posting)
+            if not candidates:
+                return []
+        # n-gram overlap is necessary but not sufficient for a substring hit
+        return [value_id for value_id in candidates if needle in values[value_id]]
+
+    def _prefix_entries(self, prefix):
+        vocabulary = self.vocabulary
+        entry_ids = set()
+        for position in range(bisect_left(vocabulary, prefix), len(vocabulary)):
+            token = vocabulary[position]
+            if not token.startswith(prefix):
+                break
+            entry_ids.update(self._tokens[token])
+        return list(entry_ids)
+
+    def search(self, query):
+        """Row positions whose indexed fields contain query, in catalog order"""
+        needle = query.lower()
+        if not needle:
+            return list(range(self.size))
+        entry_ids = self._substring_entries(needle)
+        return self._rows(entry_ids) if entry_ids else []
+
+    def search_prefix(self, query):
+        """Row positions having a token starting with every query word"""
+        words = _TOKEN_RE.findall(query.lower())
+        if not words:
+            return list(range(self.size))
+        matched = None
+        for word in sorted(set(words), key=len, reverse=True):
+            entry_ids = self._prefix_entries(word)
+            rows = self._rows(entry_ids) if entry_ids else []
+            matched = rows if matched is None else _intersect(matched, rows)
+            if not matched:
+                return []
+        return matched
+
+    def _expand(self, word, prefix):
+        """{token: weight} a query word matches: itself, prefixes if asked, near misses"""
+        expansion = {}
+        if word in self._tokens:
+            expansion[word] = 1.0
+        if prefix:
+            vocabulary = self.vocabulary
+            for position in range(bisect_left(vocabulary, word), len(vocabulary)):
+                token = vocabulary[position]
+                if not token.startswith(word):
+                    break
+                expansion.setdefault(token, PREFIX_WEIGHT)
+        limit = max_edits(word)
+        if limit:
+            for token, distance in self._tokens_near(word, limit):
+                if distance:
+                    expansion.setdefault(token, FUZZY_WEIGHT / distance)
+        return expansion
+
+    def _boosts(self):
+        """row -> quality boost, read live so rating changes count at once"""
+        records = self._records
+        if hasattr(records, 'schema'):
+            getters = [(records.column(field).get, scale, weight) for field, scale, weight in QUALITY_BOOSTS]
+        else:
+            getters = [((lambda row, field=field: records[row][field]), scale, weight)
+                       for field, scale, weight in QUALITY_BOOSTS]
+        return lambda row: sum(weight * min(get(row) / scale, 1.0) for get, scale, weight in getters)
+
+    def search_ranked(self, query, limit=20, skip=0):
+        """
+        (rows, scores, total) for the best matches of query, best first.
+        Every word is scored with BM25 and the sum is blended with the
+        quality boosts; the last word also matches as a prefix so
+        type-ahead input ranks while it is being typed. Only skip + limit
+        rows are ever ordered, using a heap.
+        """
+        words = list(dict.fromkeys(_TOKEN_RE.findall(query.lower())))
+        if not words or limit <= 0 or not self.size:
+            return [], [], 0
+        average_length = self._total_length / self.size or 1.0
+        lengths = self._lengths
+        text_scores = {}
+        for index, word in enumerate(words):
+            frequencies = {}
+            for token, match_weight in self._expand(word, prefix=index == len(words) - 1).items():
+                for entry_id, count in zip(self._tokens[token], self._token_counts[token]):
+                    weight = match_weight * count * self._entry_weights[entry_id]
+                    for row in self._entry_rows[entry_id]:
+                        frequencies[row] = frequencies.get(row, 0.0) + weight
+            if not frequencies:
+                continue
+            documents = len(frequencies)
+            idf = math.log(1 + (self.size - documents + 0.5) / (documents + 0.5))
+            for row, frequency in frequencies.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[row] / average_length)
+                score = idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                text_scores[row] = text_scores.get(row, 0.0) + score
+        if not text_scores:
+            return [], [], 0
+        top_text = max(text_scores.values())
+        boost = self._boosts()
+        scored = ((TEXT_WEIGHT * score / top_text + boost(row), row) for row, score in text_scores.items())
+        # Ties go to the earlier row so pages never overlap
+        best = heapq.nlargest(skip + limit, scored, key=lambda item: (item[0], -item[1]))[skip:]
+        return [row for _, row in best], [round(score, 4) for score, _ in best], len(text_scores)
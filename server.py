@@ -8,10 +8,16 @@ import socket
 import json
 import os
 import math
+from http import HTTPStatus
 from pathlib import Path
 
+from health import HEALTH_PATH, PROBE_HEADERS, READY_PATH, Readiness, probe_response
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics, route_label
+
 PORT = 3002
 FRONTEND_DIR = Path(__file__).parent / 'frontend'
+# Paths with their own series in /metrics
+ROUTES = ('/', '/index.html', '/api/dashboard/stats', '/api/dashboard/suppliers', '/metrics', '/health', '/ready')
 
 print('[SERVER] Starting Walmart Supplier Portal...')
 print(f'[SERVER] Frontend: {FRONTEND_DIR}')
@@ -24,6 +30,7 @@ def seeded_random(seed):
 
 # Generate suppliers
 print('[SERVER] Generating suppliers...')
+readiness = Readiness('server', stages=('data', 'static'))
 suppliers = []
 for i in range(5000):
     seed = 1962 + i
@@ -40,12 +47,14 @@ for i in range(5000):
         'walmartVerified': seeded_random(seed + 850) > 0.3
     })
 print(f'[SERVER] {len(suppliers)} suppliers ready')
+readiness.done('data', suppliersLoaded=len(suppliers))
 
 # Read HTML once
 html_file = FRONTEND_DIR / 'index.html'
 if html_file.exists():
     html_content = html_file.read_bytes()
     print(f'[SERVER] Loaded index.html ({len(html_content)} bytes)')
+    readiness.done('static')
 else:
     print('[SERVER] ERROR: index.html not found!')
     html_content = b'<h1>File not found</h1>'
@@ -67,6 +76,8 @@ try:
     print(f'[SERVER] ================================\n')
     
     while True:
+        request_metrics = None
+        response = b''
         try:
             client, addr = server.accept()
             data = client.recv(4096).decode('utf-8', errors='ignore')
@@ -84,6 +95,7 @@ try:
             except:
                 client.close()
                 continue
+            request_metrics = metrics.start('server', method, route_label(path, ROUTES))
             
             # Route requests
             if path in ['/', '/index.html']:
@@ -95,6 +107,22 @@ try:
                 response += b'Connection: close\r\n\r\n'
                 response += html_content
             
+            elif path in (HEALTH_PATH, READY_PATH):
+                status, body = probe_response(readiness, path)
+                response = f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n'.encode()
+                response += b'Content-Type: application/json\r\n'
+                response += b'Access-Control-Allow-Origin: *\r\n'
+                for name, value in PROBE_HEADERS:
+                    response += f'{name}: {value}\r\n'.encode()
+                response += f'Content-Length: {len(body)}\r\n'.encode()
+                response += b'Connection: close\r\n\r\n'
+                response += body
+            
+            elif path == '/metrics':
+                body = metrics.render().encode()
+                response = (f'HTTP/1.1 200 OK\r\nContent-Type: {METRICS_CONTENT_TYPE}\r\n'
+                            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n').encode() + body
+            
             elif path == '/api/dashboard/stats':
                 data_dict = {
                     'success': True,
@@ -129,6 +157,13 @@ try:
         
         except Exception as e:
             print(f'[SERVER] Error: {e}')
+            if request_metrics is not None:
+                metrics.finish(request_metrics, 500, 0, error=True)
+                request_metrics = None
+        
+        finally:
+            if request_metrics is not None:
+                metrics.finish(request_metrics, int(response.split(b' ', 2)[1]), len(response))
 
 except KeyboardInterrupt:
     print('\n[SERVER] Shutting down...')
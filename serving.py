@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Serving - Concurrent serving shared by the Python servers
+The accept loop hands each connection to a bounded worker pool; the
+event-loop server for the master API is async_server.py
+"""
+
+import argparse
+import http.server
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+DEFAULT_BACKLOG = 128
+DEFAULT_TIMEOUT = 30.0
+# An idle keep-alive connection holds a worker thread, so it is dropped
+# much sooner than a slow request would be
+DEFAULT_KEEP_ALIVE_TIMEOUT = 5.0
+
+def add_serving_arguments(parser):
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'worker threads handling connections (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--backlog', type=int, default=DEFAULT_BACKLOG,
+                        help=f'listen() backlog (default: {DEFAULT_BACKLOG})')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help=f'per-connection socket timeout in seconds (default: {DEFAULT_TIMEOUT:g})')
+    parser.add_argument('--keep-alive-timeout', type=float, default=DEFAULT_KEEP_ALIVE_TIMEOUT,
+                        help=f'seconds an idle keep-alive connection may wait for its next request '
+                             f'(default: {DEFAULT_KEEP_ALIVE_TIMEOUT:g})')
+    return parser
+
+def parse_args(description, prefork=False):
+    parser = add_serving_arguments(argparse.ArgumentParser(description=description))
+    if prefork:
+        parser.add_argument('--processes', type=int, default=1,
+                            help='pre-forked worker processes sharing the port (default: 1)')
+    return parser.parse_args()
+
+class BoundedExecutor:
+    """Thread pool whose submit() blocks once every worker and queue slot is taken"""
+
+    def __init__(self, workers, queue_size=None):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='worker')
+        self._slots = threading.BoundedSemaphore(workers + (workers if queue_size is None else queue_size))
+
+    def submit(self, fn, *args):
+        # Blocking here stops the accept loop, leaving new clients in the kernel backlog
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+def serve_socket(listener, handle, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT):
+    """Accept on a listening socket forever, running handle(request, address) in a pool"""
+    executor = BoundedExecutor(workers)
+    try:
+        while True:
+            request, client_address = listener.accept()
+            request.settimeout(timeout)
+            executor.submit(handle, request, client_address)
+    finally:
+        executor.shutdown(wait=False)
+
+class KeepAliveMixin:
+    """
+    BaseHTTPRequestHandler mixin for HTTP/1.1 handlers: between requests
+    the connection waits at most the server's keep_alive_timeout, then
+    closes and frees its worker; a request once started gets the full
+    connection timeout
+    """
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self.wait_for_request():
+            self.handle_one_request()
+
+    def wait_for_request(self):
+        """True once the next request has started arriving; False if the client stays idle or hangs up"""
+        server = self.server
+        self.connection.settimeout(getattr(server, 'keep_alive_timeout', DEFAULT_KEEP_ALIVE_TIMEOUT))
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(getattr(server, 'connection_timeout', DEFAULT_TIMEOUT))
+
+class PooledHTTPServer(http.server.HTTPServer):
+    """HTTPServer that serves connections from a bounded worker pool"""
+
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS,
+                 backlog=DEFAULT_BACKLOG, timeout=DEFAULT_TIMEOUT, reuse_port=False,
+                 keep_alive_timeout=DEFAULT_KEEP_ALIVE_TIMEOUT, bind_and_activate=True):
+        self.request_queue_size = backlog
+        self.reuse_port = reuse_port
+        self.workers = workers
+        self.connection_timeout = timeout
+        self.keep_alive_timeout = keep_alive_timeout
+        self.executor = BoundedExecutor(workers)
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+    def server_bind(self):
+        if self.reuse_port:
+            # Pre-forked workers each bind the port; the kernel balances accepts
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        request.settimeout(self.connection_timeout)
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+def create_server(server_address, handler_class, args):
+    """PooledHTTPServer configured from parse_args() options"""
+    return PooledHTTPServer(server_address, handler_class, workers=args.workers,
+                            backlog=args.backlog, timeout=args.timeout,
+                            reuse_port=getattr(args, 'processes', 1) > 1,
+                            keep_alive_timeout=args.keep_alive_timeout)
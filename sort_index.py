@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Sort Index - Presorted row permutations for server-side sorting
+Each sortable field keeps its rows ordered by (value, row) and a private
+copy of the sort keys. Pages resume from an opaque cursor holding the last
+(value, row) seen, so a deep page costs a bisect plus the page itself and
+stays stable while rows are added or changed
+"""
+
+import base64
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+SORT_FIELDS = ('rating', 'aiScore', 'employees', 'yearsInBusiness', 'name')
+SORT_ORDERS = ('asc', 'desc')
+
+def encode_cursor(sort, order, value, row):
+    data = json.dumps([sort, order, value, row], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def decode_cursor(token, sort, order):
+    """(value, row) from a cursor token issued for the same sort and order"""
+    try:
+        data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        cursor_sort, cursor_order, value, row = json.loads(data)
+    except ValueError:
+        raise ValueError('invalid cursor')
+    if (cursor_sort, cursor_order) != (sort, order) or not isinstance(row, int):
+        raise ValueError('cursor does not match the requested sort')
+    return value, row
+
+def _sort_keys(records, field):
+    if hasattr(records, 'schema'):
+        data = getattr(records.column(field), 'data', None)
+        if isinstance(data, array):
+            # Numeric column: copy the raw array rather than boxing every value
+            return array(data.typecode, data)
+        return list(records.values(field))
+    return [record[field] for record in records]
+
+class SortIndex:
+    def __init__(self, records, fields=SORT_FIELDS):
+        self.size = len(records)
+        self._keys = {}
+        self._orders = {}
+        for field in fields:
+            if hasattr(records, 'schema') and field not in records.fields:
+                continue
+            keys = self._keys[field] = _sort_keys(records, field)
+            # sorted() is stable, so equal values stay in row order
+            self._orders[field] = array('I', sorted(range(self.size), key=keys.__getitem__))
+
+    @property
+    def fields(self):
+        return tuple(self._orders)
+
+    def _position(self, field, value, row, right):
+        keys = self._keys[field]
+        search = bisect_right if right else bisect_left
+        return search(self._orders[field], (value, row), key=lambda r: (keys[r], r))
+
+    # SupplierStore listener
+    def row_added(self, row, record):
+        self.size += 1
+        for field, keys in self._keys.items():
+            value = record[field]
+            keys.append(value)
+            self._orders[field].insert(self._position(field, value, row, True), row)
+
+    def row_changed(self, row, old, new):
+        for field, keys in self._keys.items():
+            if old[field] == new[field]:
+                continue
+            order = self._orders[field]
+            del order[self._position(field, old[field], row, False)]
+            keys[row] = new[field]
+            order.insert(self._position(field, new[field], row, True), row)
+
+    def page(self, sort, order, selected, limit, cursor=None, skip=0):
+        """
+        Return (rows, next cursor) for one page sorted by a field. selected
+        is a row bitmap (e.g. from FacetIndex.select) and None means every
+        row. next cursor is None once the last page has been returned.
+        """
+        if sort not in self._orders:
+            raise ValueError(f'sort must be one of: {", ".join(self._orders)}')
+        if order not in SORT_ORDERS:
+            raise ValueError('order must be asc or desc')
+        if skip < 0 or limit < 0:
+            raise ValueError('skip and limit must be non-negative')
+        permutation = self._orders[sort]
+        descending = order == 'desc'
+        if cursor is None:
+            start = len(permutation) - 1 if descending else 0
+        else:
+            value, row = decode_cursor(cursor, sort, order)
+            if descending:
+                start = self._position(sort, value, row, False) - 1
+            else:
+                start = self._position(sort, value, row, True)
+        positions = range(start, -1, -1) if descending else range(start, len(permutation))
+        rows = map(permutation.__getitem__, positions)
+        if selected is not None:
+            mask = selected.to_bytes((self.size + 7) // 8, 'little')
+            rows = (row for row in rows if mask[row >> 3] >> (row & 7) & 1)
+        # One extra row tells whether another page follows
+        rows = list(islice(rows, skip, skip + limit + 1))
+        if len(rows) <= limit or not limit:
+            return rows[:limit], None
+        rows.pop()
+        last = rows[-1]
+        return rows, encode_cursor(sort, order, self._keys[sort][last], last)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Static Files - In-memory static asset cache with conditional GET
+Files are read once and kept in memory (mmapped when large) with a
+content-hash ETag and Last-Modified, and reloaded when their mtime or size
+changes. Fingerprinted names such as app.3f9c2b1e.js are cached by
+browsers for a year; everything else is revalidated on each use.
+"""
+
+import email.utils
+import mimetypes
+import mmap
+import os
+import re
+import stat
+import threading
+import time
+
+from compression import MIN_COMPRESS_BYTES, compress, is_compressible, negotiate, variant_etag
+from response_cache import etag_matches, make_etag
+
+MMAP_MIN_BYTES = 1024 * 1024
+# How long a file is trusted before its mtime is checked again
+CHECK_INTERVAL = 1.0
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+FINGERPRINT = re.compile(r'[.-][0-9a-f]{8,}\.\w+$')
+
+class StaticFile:
+    __slots__ = ('path', 'version', 'mtime', 'body', 'etag', 'last_modified', 'content_type',
+                 'cache_control', 'variants', 'checked')
+
+    def __init__(self, path, st):
+        self.path = path
+        self.version = (st.st_mtime_ns, st.st_size)
+        self.mtime = int(st.st_mtime)
+        with open(path, 'rb') as f:
+            # Files are replaced rather than rewritten in place when the
+            # frontend is deployed, so a mapping keeps the old contents
+            if st.st_size >= MMAP_MIN_BYTES:
+                self.body = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.body = f.read()
+        self.etag = make_etag(self.body)
+        self.last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        fingerprinted = FINGERPRINT.search(os.path.basename(path))
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if fingerprinted else REVALIDATE_CACHE_CONTROL
+        # Compressed copies, made on first request for each coding
+        self.variants = {}
+        self.checked = time.monotonic()
+
+    def not_modified(self, if_none_match, if_modified_since, etag):
+        # If-None-Match wins over If-Modified-Since when both are sent
+        if if_none_match:
+            return etag_matches(if_none_match, etag)
+        if if_modified_since:
+            try:
+                return email.utils.parsedate_to_datetime(if_modified_since).timestamp() >= self.mtime
+            except (TypeError, ValueError, OverflowError):
+                return False
+        return False
+
+    def response(self, accept_encoding=None, if_none_match=None, if_modified_since=None):
+        """(status, headers, body) answering a GET for this file"""
+        coding = None
+        if len(self.body) >= MIN_COMPRESS_BYTES and is_compressible(self.content_type):
+            coding = negotiate(accept_encoding)
+        if coding is None:
+            body, etag = self.body, self.etag
+        else:
+            body = self.variants.get(coding)
+            if body is None:
+                body = self.variants[coding] = compress(self.body, coding, static=True)
+            etag = variant_etag(self.etag, coding)
+        headers = [('ETag', etag), ('Last-Modified', self.last_modified),
+                   ('Cache-Control', self.cache_control), ('Vary', 'Accept-Encoding')]
+        if self.not_modified(if_none_match, if_modified_since, etag):
+            return 304, headers, b''
+        headers.append(('Content-Type', self.content_type))
+        if coding is not None:
+            headers.append(('Content-Encoding', coding))
+        headers.append(('Content-Length', str(len(body))))
+        return 200, headers, body
+
+class StaticFiles:
+    def __init__(self, check_interval=CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Cached StaticFile for path, or None when it is not a regular file"""
+        path = str(path)
+        now = time.monotonic()
+        entry = self._files.get(path)
+        if entry is not None and now - entry.checked < self.check_interval:
+            return entry
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            with self._lock:
+                self._files.pop(path, None)
+            return None
+        if entry is not None and entry.version == (st.st_mtime_ns, st.st_size):
+            entry.checked = now
+            return entry
+        entry = StaticFile(path, st)
+        with self._lock:
+            self._files[path] = entry
+        return entry
+
+static_files = StaticFiles()
+
+def send_static(handler, path, headers=(), head_only=False):
+    """Answer a GET or HEAD for path from static_files; False when it is not a file"""
+    entry = static_files.get(path)
+    if entry is None:
+        return False
+    status, entry_headers, body = entry.response(handler.headers.get('Accept-Encoding'),
+                                                 handler.headers.get('If-None-Match'),
+                                                 handler.headers.get('If-Modified-Since'))
+    handler.send_response(status)
+    for name, value in entry_headers:
+        handler.send_header(name, value)
+    for name, value in headers:
+        handler.send_header(name, value)
+    handler.end_headers()
+    if body and not head_only:
+        handler.wfile.write(body)
+    return True
+
+class StaticFilesMixin:
+    """
+    SimpleHTTPRequestHandler mixin: regular files come from static_files;
+    directory listings, redirects and 404s are left to the base class
+    """
+
+    def static_path(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.split('?', 1)[0].split('#', 1)[0].endswith('/'):
+            for index in ('index.html', 'index.htm'):
+                if os.path.isfile(os.path.join(path, index)):
+                    return os.path.join(path, index)
+        return path
+
+    def do_GET(self):
+        if not send_static(self, self.static_path()):
+            super().do_GET()
+
+    def do_HEAD(self):
+        if not send_static(self, self.static_path(), head_only=True):
+            super().do_HEAD()
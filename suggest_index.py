@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Suggest Index - Type-ahead completions over supplier names, categories and cities
+Every distinct value is a completion carrying how many suppliers have it
+and their average rating. A sorted array holds the lowercased value from
+each word start, so "manu" finds "NextGen Manufacturing #12" with one
+bisect. A prefix matching more than SCAN_LIMIT keys keeps its best
+MAX_SUGGEST_LIMIT completions, merged from the lists of its longer
+prefixes, so a keystroke costs the same at any catalog size; subscribe
+the index to the store to keep counts current
+"""
+
+import heapq
+import re
+from bisect import bisect_left, insort
+
+SUGGEST_FIELDS = ('name', 'category', 'city')
+SUGGEST_ORDERS = ('popularity', 'rating')
+SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+# Prefixes matching more keys than this answer from their kept best completions
+SCAN_LIMIT = 512
+
+# Word starts, except serial-number tokens such as "#1514" that every name carries
+_WORD_START_RE = re.compile(r'(?:^|(?<=\s))(?!#\d+(?:\s|$))\S')
+_SPACES_RE = re.compile(r'\s+')
+_LAST_CHAR = '\U0010ffff'
+
+def normalize(text):
+    return _SPACES_RE.sub(' ', text.strip().lower())
+
+class SuggestIndex:
+    def __init__(self, records, fields=SUGGEST_FIELDS, rating_field='rating'):
+        if hasattr(records, 'schema'):
+            fields = [field for field in fields if field in records.fields]
+        self.fields = tuple(fields)
+        self.rating_field = rating_field
+        self._completions = []  # completion id -> [field, text, count, rating sum, lowercased text]
+        self._ids = {}          # (field, text) -> completion id
+        keys = []
+        if hasattr(records, 'schema'):
+            # Read the few columns needed instead of materializing every row
+            rows = zip(*(records.values(field) for field in (*self.fields, rating_field)))
+        else:
+            rows = ((*(record.get(field) for field in self.fields), record[rating_field]) for record in records)
+        for *values, rating in rows:
+            for field, value in zip(self.fields, values):
+                if not value:
+                    continue
+                text = str(value)
+                completion_id = self._ids.get((field, text))
+                if completion_id is None:
+                    completion_id = self._ids[field, text] = len(self._completions)
+                    lowered = normalize(text)
+                    self._completions.append([field, text, 0, 0.0, lowered])
+                    keys.extend(self._suffixes(lowered, completion_id))
+                completion = self._completions[completion_id]
+                completion[2] += 1
+                completion[3] += rating
+        keys.sort()
+        self._keys = keys   # ascending (lowercased text from a word start, completion id)
+        self._tops = {}     # prefix -> best completions per order, for prefixes over SCAN_LIMIT keys
+        self._version = 0   # bumped on every change, so a list built meanwhile is not kept
+        if len(keys) > SCAN_LIMIT:
+            self._top('', 0, len(keys))
+
+    def _values(self, record):
+        for field in self.fields:
+            value = record.get(field)
+            if value:
+                yield field, str(value)
+
+    @staticmethod
+    def _suffixes(lowered, completion_id):
+        return [(lowered[match.start():], completion_id) for match in _WORD_START_RE.finditer(lowered)]
+
+    def _add(self, record, sign):
+        for field, text in self._values(record):
+            completion_id = self._ids.get((field, text))
+            if completion_id is None:
+                completion_id = self._ids[field, text] = len(self._completions)
+                lowered = normalize(text)
+                self._completions.append([field, text, 0, 0.0, lowered])
+                for key in self._suffixes(lowered, completion_id):
+                    insort(self._keys, key)
+            completion = self._completions[completion_id]
+            completion[2] += sign
+            completion[3] += sign * record[self.rating_field]
+            # Every prefix of the value's keys may rank it differently now
+            self._version += 1
+            for key, _ in self._suffixes(completion[4], completion_id):
+                for end in range(len(key) + 1):
+                    self._tops.pop(key[:end], None)
+
+    # SupplierStore listener; a value nobody has any more keeps its keys with a zero count
+    def row_added(self, row, record):
+        self._add(record, 1)
+
+    def row_changed(self, row, old, new):
+        self._add(old, -1)
+        self._add(new, 1)
+
+    def _ranked(self, prefix, completion_ids, limit):
+        """Best ranks for prefix as (by popularity, by rating) lists; a rank ends with its completion id"""
+        # Unique values such as supplier names all count one, so popularity
+        # cannot order them: a value that starts with the prefix comes before
+        # one matched at a later word, then the better rated, then the
+        # alphabetically first
+        popular, rated = [], []
+        completions = self._completions
+        for completion_id in completion_ids:
+            field, text, count, rating_sum, lowered = completions[completion_id]
+            if count <= 0:
+                continue
+            later_word = not lowered.startswith(prefix)
+            rating = rating_sum / count
+            popular.append((-count, later_word, -rating, text, completion_id))
+            rated.append((-rating, -count, later_word, text, completion_id))
+        return heapq.nsmallest(limit, popular), heapq.nsmallest(limit, rated)
+
+    def _top(self, prefix, start, end):
+        """Kept best ranks for a prefix whose keys are keys[start:end]"""
+        top = self._tops.get(prefix)
+        if top is not None:
+            return top
+        version = self._version
+        # A completion's rank under prefix is its best rank under one of the
+        # one-character-longer prefixes, so their best (or all of their keys,
+        # when there are few) plus the keys equal to prefix hold the best
+        keys = self._keys
+        candidates = set()
+        depth = len(prefix)
+        position = start
+        while position < end and len(keys[position][0]) == depth:
+            candidates.add(keys[position][1])
+            position += 1
+        while position < end:
+            longer = keys[position][0][:depth + 1]
+            stop = bisect_left(keys, (longer + _LAST_CHAR,), position, end)
+            if stop - position <= SCAN_LIMIT:
+                candidates.update(keys[key][1] for key in range(position, stop))
+            else:
+                for ranks in self._top(longer, position, stop):
+                    candidates.update(rank[-1] for rank in ranks)
+            position = stop
+        top = self._ranked(prefix, candidates, MAX_SUGGEST_LIMIT)
+        if version == self._version:
+            self._tops[prefix] = top
+        return top
+
+    def suggest(self, prefix, limit=SUGGEST_LIMIT, order='popularity'):
+        """
+        Up to limit completions for prefix as dicts with text, field,
+        count and rating, most popular (or best rated) first. Equally
+        popular values, e.g. unique names, go by match position and rating.
+        """
+        if order not in SUGGEST_ORDERS:
+            raise ValueError(f'order must be one of: {", ".join(SUGGEST_ORDERS)}')
+        prefix = normalize(prefix)
+        limit = min(limit, MAX_SUGGEST_LIMIT)
+        if not prefix or limit <= 0:
+            return []
+        keys = self._keys
+        start = bisect_left(keys, (prefix,))
+        end = bisect_left(keys, (prefix + _LAST_CHAR,), start)
+        if end - start <= SCAN_LIMIT:
+            popular, rated = self._ranked(prefix, {keys[position][1] for position in range(start, end)}, limit)
+        else:
+            popular, rated = self._top(prefix, start, end)
+        ranks = popular if order == 'popularity' else rated
+        completions = self._completions
+        return [{'text': text, 'field': field, 'count': count, 'rating': round(rating_sum / count, 2)}
+                for field, text, count, rating_sum, _ in (completions[rank[-1]] for rank in ranks[:limit])]
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Supplier API - The read-only supplier routes shared by every server
+A SupplierAPI builds the indexes over one store, subscribes them so they
+follow its changes, and answers /api/suppliers* and /api/dashboard/*.
+Servers with user data pass a favorites bitmap as within to limit the
+listings to one user's suppliers.
+"""
+
+from facets import FacetIndex, rows_bitmap
+from json_stream import RowPage, parse_fields
+from metrics import metrics
+from search_index import MAX_RANKED_LIMIT, RANKED_LIMIT, SearchIndex
+from sort_index import SortIndex
+from suggest_index import MAX_SUGGEST_LIMIT, SUGGEST_FIELDS, SUGGEST_LIMIT, SuggestIndex
+from supplier_stats import SupplierStats
+from supplier_store import KeyIndex
+
+# Read-only supplier routes answered through the response cache
+CACHED_ROUTES = ('/api/suppliers', '/api/suppliers/suggest', '/api/dashboard/suppliers', '/api/dashboard/stats',
+                 '/api/dashboard/suppliers/search')
+
+def is_cacheable(path, query):
+    # Favorites-only listings depend on user data, which the cache never sees change
+    return path in CACHED_ROUTES and 'favorites' not in query
+
+class SupplierAPI:
+    def __init__(self, store, suggest_fields=SUGGEST_FIELDS):
+        self.store = store
+        self.search_index = SearchIndex(store)
+        self.facet_index = FacetIndex(store)
+        self.sort_index = SortIndex(store)
+        self.id_index = KeyIndex(store)
+        self.suggest_index = SuggestIndex(store, suggest_fields)
+        self.stats = SupplierStats(store)
+        for index in (self.search_index, self.facet_index, self.sort_index, self.id_index, self.suggest_index,
+                      self.stats):
+            store.subscribe(index)
+
+    def favorites_mask(self, query, user_store):
+        """Row bitmap of the user's favorites for favorites=only, otherwise None"""
+        if query.get('favorites', [''])[0] != 'only':
+            return None
+        user_id = query.get('user_id', ['anonymous'])[0]
+        rows = map(self.id_index.get, user_store.favorites(user_id))
+        return rows_bitmap(row for row in rows if row is not None)
+
+    def page(self, rows, query):
+        """Rows of the store to serialize, projected to ?fields= when given"""
+        return RowPage(self.store, rows, parse_fields(query.get('fields'), self.store))
+
+    def batch(self, ids, fields=None):
+        """Response for /api/suppliers/batch: found records in request order plus unknown ids"""
+        if not isinstance(ids, list):
+            raise ValueError('ids must be a list of supplier ids')
+        rows, not_found = self.id_index.rows(ids)
+        data = RowPage(self.store, rows, parse_fields(fields, self.store))
+        return {'success': True, 'data': data, 'notFound': not_found}
+
+    def route(self, path, query, within=None):
+        """Response dict for a GET supplier route; within is an optional row bitmap limiting the listings"""
+        try:
+            if path == '/api/suppliers':
+                skip = int(query.get('skip', ['0'])[0])
+                limit = int(query.get('limit', ['5000'])[0])
+                filters = self.facet_index.parse_filters(query)
+                rows, total, facets = self.facet_index.page(filters, skip, limit, within)
+                data = self.page(rows, query)
+                response = {'success': True, 'data': data, 'total': total, 'facets': facets}
+
+            elif path == '/api/suppliers/batch':
+                ids = [supplier_id for value in query.get('ids', []) for supplier_id in value.split(',') if supplier_id]
+                response = self.batch(ids, query.get('fields'))
+
+            elif path == '/api/suppliers/suggest':
+                prefix = query.get('prefix', [''])[0]
+                limit = min(int(query.get('limit', [str(SUGGEST_LIMIT)])[0]), MAX_SUGGEST_LIMIT)
+                suggestions = self.suggest_index.suggest(prefix, limit, query.get('order', ['popularity'])[0])
+                response = {'success': True, 'prefix': prefix, 'suggestions': suggestions}
+
+            elif path == '/api/dashboard/suppliers':
+                skip = int(query.get('skip', ['0'])[0])
+                limit = int(query.get('limit', ['5000'])[0])
+                filters = self.facet_index.parse_filters(query)
+                if 'sort' in query or 'cursor' in query:
+                    selected, facets = self.facet_index.select(filters, within)
+                    restrict = selected if filters or within is not None else None
+                    rows, cursor = self.sort_index.page(query.get('sort', [''])[0], query.get('order', ['asc'])[0],
+                                                        restrict, limit, query.get('cursor', [None])[0], skip)
+                    data = self.page(rows, query)
+                    response = {'success': True, 'suppliers': data, 'total': selected.bit_count(), 'facets': facets,
+                                'nextCursor': cursor}
+                else:
+                    rows, total, facets = self.facet_index.page(filters, skip, limit, within)
+                    data = self.page(rows, query)
+                    response = {'success': True, 'suppliers': data, 'total': total, 'facets': facets}
+
+            elif path == '/api/dashboard/stats':
+                response = {'success': True, **self.stats.snapshot()}
+
+            elif path.startswith('/api/dashboard/suppliers/search'):
+                query_str = query.get('q', [''])[0]
+                mode = query.get('mode', [''])[0]
+                scores = None
+                if mode == 'ranked':
+                    skip = int(query.get('skip', ['0'])[0])
+                    limit = min(int(query.get('limit', [str(RANKED_LIMIT)])[0]), MAX_RANKED_LIMIT)
+                    rows, scores, total = self.search_index.search_ranked(query_str, limit, skip)
+                elif mode == 'prefix':
+                    rows = self.search_index.search_prefix(query_str)
+                else:
+                    rows = self.search_index.search(query_str)
+                results = self.page(rows, query)
+                response = {'success': True, 'results': results}
+                if scores is not None:
+                    response.update(scores=scores, total=total)
+
+            else:
+                response = {'success': False, 'error': 'Not found'}
+
+        except Exception as e:
+            metrics.mark_error()
+            response = {'success': False, 'error': str(e)}
+
+        return response
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Supplier Stats - Aggregates behind /api/dashboard/stats
+Computed once at load time and kept current as suppliers are added or
+changed, so a stats request is a dictionary read instead of full scans
+"""
+
+import math
+from collections import Counter
+
+def rating_bucket(rating):
+    """Histogram bucket label: ratings grouped into half-star bins"""
+    return f'{math.floor(rating * 2) / 2:.1f}'
+
+class SupplierStats:
+    def __init__(self, records=()):
+        self.total = 0
+        self.rating_sum = 0.0
+        self.verified = 0
+        self.categories = Counter()
+        self.regions = Counter()
+        self.rating_histogram = Counter()
+        self._snapshot = None
+        if hasattr(records, 'schema'):
+            self._load_columns(records)
+        else:
+            for record in records:
+                self._apply(record, 1)
+
+    def _load_columns(self, store):
+        # Columnar store: aggregate over the raw arrays, no row dicts
+        ratings = store.column('rating').data
+        self.total = len(store)
+        self.rating_sum = sum(ratings)
+        self.verified = sum(store.column('walmartVerified').data)
+        self.categories.update(store.values('category'))
+        self.regions.update(store.values('region'))
+        self.rating_histogram.update(map(rating_bucket, ratings))
+
+    def _apply(self, record, sign):
+        self.total += sign
+        self.rating_sum += sign * record['rating']
+        self.verified += sign * bool(record['walmartVerified'])
+        for counter, key in ((self.categories, record['category']),
+                             (self.regions, record['region']),
+                             (self.rating_histogram, rating_bucket(record['rating']))):
+            counter[key] += sign
+            if counter[key] <= 0:
+                del counter[key]
+        self._snapshot = None
+
+    # SupplierStore listener
+    def row_added(self, row, record):
+        self._apply(record, 1)
+
+    def row_changed(self, row, old, new):
+        self._apply(old, -1)
+        self._apply(new, 1)
+
+    def snapshot(self):
+        """Current stats payload; rebuilt only after a change"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            avg_rating = self.rating_sum / self.total if self.total else 0
+            snapshot = self._snapshot = {
+                'totalSuppliers': self.total,
+                'totalCategories': len(self.categories),
+                'avgRating': round(avg_rating, 1),
+                'verifiedCount': self.verified,
+                'categories': dict(self.categories),
+                'regions': dict(self.regions),
+                'ratingHistogram': dict(sorted(self.rating_histogram.items())),
+            }
+        return snapshot
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Supplier Store - Columnar, array-backed supplier storage
+Numeric fields live in contiguous array columns and repeated strings are
+dictionary-encoded as small-int codes; rows are only materialized into
+dicts when a handler serializes them
+"""
+
+import json
+from array import array
+from itertools import accumulate, chain, islice
+from json.encoder import encode_basestring_ascii
+
+# Column kinds used in supplier schemas
+INT = 'int'
+FLOAT = 'float'
+BOOL = 'bool'
+TEXT = 'text'
+CATEGORY = 'category'
+CATEGORY_LIST = 'category_list'
+
+MAX_ROW_ENCODERS = 64
+
+def _json_value(value):
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    return json.dumps(value)
+
+def _json_float(value):
+    # Same spelling json.dumps uses, including its non-finite extensions
+    if value != value:
+        return 'NaN'
+    if value == float('inf'):
+        return 'Infinity'
+    if value == -float('inf'):
+        return '-Infinity'
+    return float.__repr__(value)
+
+# Each column's encoder() returns row -> JSON text of that row's value,
+# spelled exactly as json.dumps would spell it
+
+class _NumberColumn:
+    typecode = 'q'
+
+    def __init__(self):
+        self.data = array(self.typecode)
+
+    def append(self, value):
+        self.data.append(value)
+
+    def extend(self, values):
+        self.data.extend(values)
+
+    def get(self, row):
+        return self.data[row]
+
+    def set(self, row, value):
+        self.data[row] = value
+
+    def encoder(self):
+        return lambda row: int.__repr__(self.data[row])
+
+class _FloatColumn(_NumberColumn):
+    typecode = 'd'
+
+    def encoder(self):
+        return lambda row: _json_float(self.data[row])
+
+class _BoolColumn(_NumberColumn):
+    typecode = 'B'
+
+    def get(self, row):
+        return self.data[row] == 1
+
+    def encoder(self):
+        return lambda row: 'true' if self.data[row] == 1 else 'false'
+
+class _TextColumn:
+    def __init__(self):
+        self.data = []
+
+    def append(self, value):
+        self.data.append(value)
+
+    def extend(self, values):
+        self.data.extend(values)
+
+    def get(self, row):
+        return self.data[row]
+
+    def set(self, row, value):
+        self.data[row] = value
+
+    def encoder(self):
+        return lambda row: _json_value(self.data[row])
+
+class _Dictionary:
+    """
+    Shared value <-> code mapping; codes widen from 16 to 32 bits on demand.
+    Each value's JSON text is kept next to it, so encoding a row is a lookup.
+    """
+
+    def __init__(self):
+        self.vocabulary = []
+        self.json_values = []
+        self.codes = {}
+        self.data = array('H')
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.vocabulary)
+            if code == 0x10000:
+                self.data = array('I', self.data)
+            self.json_values.append(_json_value(value))
+            self.vocabulary.append(value)
+            self.codes[value] = code
+        return code
+
+class _CategoryColumn(_Dictionary):
+    def append(self, value):
+        self.data.append(self.encode(value))
+
+    def extend(self, values):
+        values = list(values)
+        # Register new values in first-seen order, then encode in one C-level pass
+        for value in dict.fromkeys(values):
+            self.encode(value)
+        self.data.extend(map(self.codes.__getitem__, values))
+
+    def get(self, row):
+        return self.vocabulary[self.data[row]]
+
+    def set(self, row, value):
+        self.data[row] = self.encode(value)
+
+    def encoder(self):
+        return lambda row: self.json_values[self.data[row]]
+
+class _CategoryListColumn(_Dictionary):
+    def __init__(self):
+        super().__init__()
+        self.offsets = array('Q', [0])
+
+    def append(self, values):
+        for value in values:
+            self.data.append(self.encode(value))
+        self.offsets.append(len(self.data))
+
+    def extend(self, rows):
+        rows = list(rows)
+        values = list(chain.from_iterable(rows))
+        for value in dict.fromkeys(values):
+            self.encode(value)
+        self.data.extend(map(self.codes.__getitem__, values))
+        self.offsets.extend(islice(accumulate(map(len, rows), initial=self.offsets[-1]), 1, None))
+
+    def get(self, row):
+        vocabulary = self.vocabulary
+        return [vocabulary[code] for code in self.data[self.offsets[row]:self.offsets[row + 1]]]
+
+    def set(self, row, values):
+        start, end = self.offsets[row], self.offsets[row + 1]
+        codes = [self.encode(value) for value in values]
+        self.data[start:end] = array(self.data.typecode, codes)
+        shift = len(codes) - (end - start)
+        if shift:
+            for later in range(row + 1, len(self.offsets)):
+                self.offsets[later] += shift
+
+    def encoder(self):
+        def encode(row):
+            codes = self.data[self.offsets[row]:self.offsets[row + 1]]
+            return '[' + ', '.join(map(self.json_values.__getitem__, codes)) + ']'
+        return encode
+
+_COLUMN_TYPES = {
+    INT: _NumberColumn,
+    FLOAT: _FloatColumn,
+    BOOL: _BoolColumn,
+    TEXT: _TextColumn,
+    CATEGORY: _CategoryColumn,
+    CATEGORY_LIST: _CategoryListColumn,
+}
+
+class SupplierStore:
+    """
+    Sequence of supplier rows backed by per-field columns.
+    Indexing and slicing return plain dicts in schema order, so handlers can
+    keep treating the store like the old list of supplier dicts.
+    """
+
+    def __init__(self, schema):
+        self.schema = tuple(schema)
+        self.fields = tuple(field for field, _ in self.schema)
+        self._columns = {field: _COLUMN_TYPES[kind]() for field, kind in self.schema}
+        self._size = 0
+        self._listeners = []
+        self._encoders = {}
+
+    @classmethod
+    def from_records(cls, schema, records):
+        store = cls(schema)
+        for record in records:
+            store.append(record)
+        return store
+
+    @classmethod
+    def from_columns(cls, schema, columns):
+        """Build a store from one equally long value sequence per field"""
+        store = cls(schema)
+        sizes = {len(values) for values in columns.values()}
+        if len(sizes) > 1 or set(columns) != set(store.fields):
+            raise ValueError('columns must cover every schema field with equal lengths')
+        for field, values in columns.items():
+            store._columns[field].extend(values)
+        store._size = sizes.pop() if sizes else 0
+        return store
+
+    def subscribe(self, listener):
+        """Register an object with row_added(row, record) / row_changed(row, old, new)"""
+        self._listeners.append(listener)
+
+    def append(self, record):
+        for field, column in self._columns.items():
+            column.append(record[field])
+        row = self._size
+        self._size += 1
+        for listener in self._listeners:
+            listener.row_added(row, record)
+        return row
+
+    def update(self, row, changes):
+        """Overwrite some fields of one row and notify listeners"""
+        old = self[row]
+        if row < 0:
+            row += self._size
+        for field, value in changes.items():
+            self._columns[field].set(row, value)
+        new = self.row(row)
+        for listener in self._listeners:
+            listener.row_changed(row, old, new)
+        return new
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for row in range(self._size):
+            yield self.row(row)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(row) for row in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('supplier index out of range')
+        return self.row(index)
+
+    def row(self, row, fields=None):
+        """Materialize one row as a dict, optionally with only some fields"""
+        if fields is None:
+            return {field: column.get(row) for field, column in self._columns.items()}
+        columns = self._columns
+        return {field: columns[field].get(row) for field in fields}
+
+    def row_encoder(self, fields=None):
+        """
+        Compiled row -> JSON text function for a field set, producing the
+        same text as json.dumps(self.row(row, fields)) without building the
+        dict. Encoders are cached per field set.
+        """
+        encoder = self._encoders.get(fields)
+        if encoder is None:
+            names = self.fields if fields is None else fields
+            parts = tuple((('{' if index == 0 else ', ') + encode_basestring_ascii(field) + ': ',
+                           self._columns[field].encoder()) for index, field in enumerate(names))
+
+            def encoder(row):
+                return ''.join([prefix + encode(row) for prefix, encode in parts]) + '}' if parts else '{}'
+
+            if len(self._encoders) >= MAX_ROW_ENCODERS:
+                self._encoders.clear()
+            self._encoders[fields] = encoder
+        return encoder
+
+    def column(self, field):
+        """Raw column object; numeric columns expose their array as .data"""
+        return self._columns[field]
+
+    def values(self, field):
+        """Decoded values of one field in row order"""
+        column = self._columns[field]
+        return (column.get(row) for row in range(self._size))
+
+class KeyIndex:
+    """Maps a unique field (normally id) to its row; subscribe it to keep it current"""
+
+    def __init__(self, store, field='id'):
+        self.field = field
+        self._rows = {value: row for row, value in enumerate(store.values(field))}
+
+    def get(self, value):
+        """
+        Row for a key, or None. Keys are ints or strings, and digit strings
+        ('42') also match int keys; bools and floats, which would compare
+        equal to an int id, match nothing.
+        """
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            return None
+        row = self._rows.get(value)
+        if row is None and isinstance(value, str) and value.isascii() and value.isdigit():
+            row = self._rows.get(int(value))
+        return row
+
+    def rows(self, keys):
+        """(rows for the keys that exist in the given order, keys that do not)"""
+        rows = []
+        missing = []
+        for key in keys:
+            row = self.get(key)
+            if row is None:
+                missing.append(key)
+            else:
+                rows.append(row)
+        return rows, missing
+
+    def __len__(self):
+        return len(self._rows)
+
+    # SupplierStore listener
+    def row_added(self, row, record):
+        self._rows[record[self.field]] = row
+
+    def row_changed(self, row, old, new):
+        if old[self.field] != new[self.field]:
+            del self._rows[old[self.field]]
+            self._rows[new[self.field]] = row
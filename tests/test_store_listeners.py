@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Store listeners - every index kept current through SupplierStore.append and
+update must agree with the same index rebuilt from the changed store
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_server import generate_suppliers
+from facets import FacetIndex
+from response_cache import ResponseCache, cache_key, lookup
+from search_index import SearchIndex
+from sort_index import SortIndex
+from suggest_index import SuggestIndex
+from supplier_stats import SupplierStats
+from supplier_store import KeyIndex
+
+SIZE = 300
+QUERIES = ('steel', 'zeppelin', 'airship', 'renamed', 'manu', 'plumbing supply')
+
+class StoreListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.store = generate_suppliers(SIZE)
+        self.indexes = {
+            'facets': FacetIndex(self.store),
+            'search': SearchIndex(self.store),
+            'sort': SortIndex(self.store),
+            'ids': KeyIndex(self.store),
+            'suggest': SuggestIndex(self.store),
+            'stats': SupplierStats(self.store),
+        }
+        for index in self.indexes.values():
+            self.store.subscribe(index)
+
+    def change_store(self):
+        store = self.store
+        store.update(9, {'id': 99999, 'category': 'Zeppelins', 'name': 'Renamed Airship #9'})
+        store.update(9, {'category': 'Plumbing', 'rating': 5.0})
+        store.update(20, {'region': 'Antarctica', 'walmartVerified': not store[20]['walmartVerified']})
+        store.update(21, {'employees': 1, 'aiScore': 100, 'products': ('Zeppelins', 'Steel & Metal')})
+        record = dict(store[5], id=SIZE + 1, name='Zeppelin Works #301', category='Zeppelins')
+        store.append(record)
+
+    def assert_indexes_agree(self):
+        store = self.store
+        facets, fresh_facets = self.indexes['facets'], FacetIndex(store)
+        self.assertEqual(facets.bitmaps, fresh_facets.bitmaps)
+        self.assertEqual(facets.select({}), fresh_facets.select({}))
+        for category in fresh_facets.bitmaps['category']:
+            self.assertEqual(facets.page({'category': [category]}, 0, len(store)),
+                             fresh_facets.page({'category': [category]}, 0, len(store)))
+
+        search, fresh_search = self.indexes['search'], SearchIndex(store)
+        for query in QUERIES:
+            self.assertEqual(search.search(query), fresh_search.search(query), query)
+            self.assertEqual(search.search_prefix(query), fresh_search.search_prefix(query), query)
+            self.assertEqual(search.search_ranked(query, 20), fresh_search.search_ranked(query, 20), query)
+
+        sort, fresh_sort = self.indexes['sort'], SortIndex(store)
+        for field in fresh_sort.fields:
+            for order in ('asc', 'desc'):
+                self.assertEqual(sort.page(field, order, None, len(store)),
+                                 fresh_sort.page(field, order, None, len(store)), (field, order))
+
+        ids = self.indexes['ids']
+        self.assertEqual(len(ids), len(store))
+        for row, supplier_id in enumerate(store.values('id')):
+            self.assertEqual(ids.get(supplier_id), row)
+
+        suggest, fresh_suggest = self.indexes['suggest'], SuggestIndex(store)
+        for prefix in QUERIES:
+            self.assertEqual(suggest.suggest(prefix, 20), fresh_suggest.suggest(prefix, 20), prefix)
+
+        self.assertEqual(self.indexes['stats'].snapshot(), SupplierStats(store).snapshot())
+
+    def test_indexes_follow_updates_and_appends(self):
+        self.change_store()
+        self.assert_indexes_agree()
+
+    def test_changed_id_is_followed(self):
+        self.store.update(9, {'id': 99999, 'category': 'Zeppelins'})
+        ids = self.indexes['ids']
+        self.assertIsNone(ids.get(10))
+        self.assertEqual(ids.get(99999), 9)
+        rows, total, _ = self.indexes['facets'].page({'category': ['Zeppelins']}, 0, 10)
+        self.assertEqual((list(rows), total), ([9], 1))
+        self.assert_indexes_agree()
+
+    def test_response_cache_is_cleared(self):
+        cache = ResponseCache()
+        self.store.subscribe(cache)
+        key = cache_key('/api/dashboard/stats', '')
+        cache.put(key, b'{}')
+        self.store.update(0, {'rating': 3.5})
+        self.assertIsNone(cache.get(key))
+
+    def test_response_rendered_before_a_change_is_not_cached(self):
+        cache = ResponseCache()
+        self.store.subscribe(cache)
+        key = cache_key('/api/dashboard/stats', '')
+        stats = self.indexes['stats']
+
+        def render():
+            response = {'success': True, **stats.snapshot()}
+            # The data changes while this response is being encoded
+            self.store.update(0, {'rating': 3.5})
+            return response
+
+        lookup(cache, key, render)
+        self.assertIsNone(cache.get(key))
+        entry = lookup(cache, key, lambda: {'success': True, **stats.snapshot()})
+        self.assertIs(cache.get(key), entry)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Suggest Index - completions answered from the kept lists of wide prefixes
+must match ranking every matching value, before and after the store changes
+"""
+
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import suggest_index
+from data_server import generate_suppliers
+from suggest_index import SuggestIndex, normalize
+
+SIZE = 300
+
+def value_counts(store):
+    """(field, text) -> (count, rating sum) over the suggested fields"""
+    values = {}
+    for record in store:
+        for field in ('name', 'category', 'city'):
+            count, rating_sum = values.get((field, record[field]), (0, 0.0))
+            values[field, record[field]] = count + 1, rating_sum + record['rating']
+    return values
+
+def brute_force(values, prefix, limit, order):
+    """Every value with a word starting with prefix, ranked the way suggest documents"""
+    prefix = normalize(prefix)
+    matched = []
+    for (field, text), (count, rating_sum) in values.items():
+        words = normalize(text).split(' ')
+        starts = [' '.join(words[i:]) for i, word in enumerate(words) if not (word[1:].isdigit() and word[0] == '#')]
+        if any(start.startswith(prefix) for start in starts):
+            later_word = not normalize(text).startswith(prefix)
+            rating = rating_sum / count
+            if order == 'popularity':
+                rank = (-count, later_word, -rating, text)
+            else:
+                rank = (-rating, -count, later_word, text)
+            matched.append((rank, {'text': text, 'field': field, 'count': count, 'rating': round(rating, 2)}))
+    return [completion for _, completion in sorted(matched, key=lambda item: item[0])[:limit]]
+
+class SuggestIndexTest(unittest.TestCase):
+    def setUp(self):
+        # A low limit so most prefixes answer from kept lists
+        patcher = mock.patch.object(suggest_index, 'SCAN_LIMIT', 8)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = generate_suppliers(SIZE)
+        self.index = SuggestIndex(self.store)
+        self.store.subscribe(self.index)
+
+    def prefixes(self):
+        for key, _ in self.index._keys[::29]:
+            for end in range(1, len(key) + 1):
+                yield key[:end]
+
+    def assert_matches_brute_force(self):
+        values = value_counts(self.store)
+        for prefix in set(self.prefixes()) | {'s', 'steel', 'zeppelin', '#', '#12'}:
+            for order in ('popularity', 'rating'):
+                self.assertEqual(self.index.suggest(prefix, 12, order), brute_force(values, prefix, 12, order),
+                                 (prefix, order))
+
+    def test_matches_brute_force(self):
+        self.assertTrue(self.index._tops)
+        self.assert_matches_brute_force()
+
+    def test_matches_brute_force_after_changes(self):
+        self.index.suggest('s')
+        self.store.update(3, {'name': 'Steel Zeppelin Works #4', 'rating': 5.0})
+        self.store.update(4, {'category': 'Steel & Metal', 'rating': 3.5})
+        self.store.append(dict(self.store[5], id=SIZE + 1, name='Zeppelin Yards #301', city='Zurich'))
+        self.assert_matches_brute_force()
+
+    def test_serial_numbers_are_not_word_starts(self):
+        self.assertEqual(self.index.suggest('#1'), [])
+        # The whole name still completes
+        suggestions = self.index.suggest('global supplies inc #1')
+        self.assertTrue(suggestions)
+        for suggestion in suggestions:
+            self.assertTrue(suggestion['text'].startswith('Global Supplies Inc #1'), suggestion)
+
+if __name__ == '__main__':
+    unittest.main()
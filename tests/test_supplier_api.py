@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Supplier API - the shared routes limit every listing, sorted or not, to
+the rows in within
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_server import generate_suppliers
+from facets import rows_bitmap
+from supplier_api import SupplierAPI
+
+class SupplierAPITest(unittest.TestCase):
+    def setUp(self):
+        self.api = SupplierAPI(generate_suppliers(300))
+        self.within = rows_bitmap((3, 14, 15, 92, 65))
+
+    def ids(self, data):
+        return sorted(record['id'] for record in data)
+
+    def test_listing_without_within_returns_every_row(self):
+        response = self.api.route('/api/dashboard/suppliers', {'sort': ['rating'], 'limit': ['1000']})
+        self.assertEqual(response['total'], 300)
+        self.assertEqual(len(list(response['suppliers'])), 300)
+
+    def test_within_limits_unsorted_and_sorted_listings(self):
+        expected = [4, 15, 16, 66, 93]
+        for query in ({}, {'sort': ['rating']}, {'sort': ['name'], 'order': ['desc']}):
+            with self.subTest(query=query):
+                response = self.api.route('/api/dashboard/suppliers', query, self.within)
+                self.assertEqual(response['total'], 5)
+                self.assertEqual(self.ids(response['suppliers']), expected)
+        response = self.api.route('/api/suppliers', {}, self.within)
+        self.assertEqual(self.ids(response['data']), expected)
+
+    def test_batch_matches_only_int_and_digit_string_ids(self):
+        response = self.api.batch([True, 2.0, '3', 4, None, [5], '1e1', 99999])
+        self.assertEqual([record['id'] for record in response['data']], [3, 4])
+        self.assertEqual(response['notFound'], [True, 2.0, None, [5], '1e1', 99999])
+
+    def test_unknown_path_and_bad_input(self):
+        self.assertEqual(self.api.route('/api/nope', {}), {'success': False, 'error': 'Not found'})
+        response = self.api.route('/api/dashboard/suppliers', {'sort': ['bogus']})
+        self.assertFalse(response['success'])
+
+if __name__ == '__main__':
+    unittest.main()
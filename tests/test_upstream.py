@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Upstream - coalesced GETs hand the leader's failure, whatever it is, to
+every request waiting on it
+"""
+
+import http.client
+import sys
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from upstream import UpstreamProxy
+
+class CoalescedErrorTest(unittest.TestCase):
+    def test_waiter_gets_the_leaders_exception(self):
+        proxy = UpstreamProxy('http://localhost:1')
+        fetching = threading.Event()
+        release = threading.Event()
+
+        def request(method, target, headers=None, body=None):
+            fetching.set()
+            release.wait(5)
+            raise http.client.InvalidURL('bad target')
+
+        proxy.pool.request = request
+        errors = []
+
+        def get():
+            try:
+                proxy.get('/api/suppliers')
+            except Exception as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=get)
+        leader.start()
+        self.assertTrue(fetching.wait(5))
+        # Know when the second request is waiting on the leader's call
+        waiting = threading.Event()
+        call, = proxy._in_flight.values()
+        done = call.done
+        call.done = mock.Mock(wait=lambda: (waiting.set(), done.wait()), set=done.set)
+        waiter = threading.Thread(target=get)
+        waiter.start()
+        self.assertTrue(waiting.wait(5))
+        release.set()
+        leader.join(5)
+        waiter.join(5)
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(all(isinstance(error, http.client.InvalidURL) for error in errors), errors)
+        self.assertFalse(proxy._in_flight)
+
+if __name__ == '__main__':
+    unittest.main()
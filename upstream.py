@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Upstream - Pooled, cached HTTP client for proxying to the data server
+Requests reuse persistent HTTP/1.1 connections, identical requests in
+flight at the same time share one upstream call, successful responses are
+kept for a short TTL, and a circuit breaker fails fast while the data
+server is down so proxy calls do not pile up on its timeouts
+"""
+
+import http.client
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlsplit
+
+from response_cache import cache_key
+from serving import DEFAULT_WORKERS
+
+# Every pooled connection holds one data server worker while it is open,
+# so the pool stays well below the data server's default worker count and
+# direct clients (browsers call the data server too) still get served
+POOL_SIZE = max(1, DEFAULT_WORKERS // 2)
+UPSTREAM_TIMEOUT = 5.0
+CACHE_TTL = 2.0
+CACHE_ENTRIES = 256
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 10.0
+PASSTHROUGH_HEADERS = ('Content-Type', 'Content-Encoding', 'ETag')
+
+UpstreamResponse = namedtuple('UpstreamResponse', 'status headers body')
+
+class UpstreamError(Exception):
+    pass
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+class ConnectionPool:
+    """Keeps up to size idle keep-alive connections; size also caps concurrent requests"""
+
+    def __init__(self, host, port, size=POOL_SIZE, timeout=UPSTREAM_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def request(self, method, target, headers=None, body=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise UpstreamError('no free upstream connection')
+        try:
+            return self._request(method, target, headers or {}, body)
+        finally:
+            self._slots.release()
+
+    def _request(self, method, target, headers, body):
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        # A reused connection may have been closed by the server while idle,
+        # so a failure on one gets a single retry on a fresh connection
+        reused = connection is not None
+        while True:
+            if connection is None:
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request(method, target, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                if reused:
+                    reused = False
+                    connection = None
+                    continue
+                raise UpstreamError(f'{method} {target} failed: {e}') from e
+            if response.will_close:
+                connection.close()
+            else:
+                with self._lock:
+                    self._idle.append(connection)
+            headers = [(name, response.getheader(name)) for name in PASSTHROUGH_HEADERS
+                       if response.getheader(name) is not None]
+            return UpstreamResponse(response.status, headers, data)
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls
+    until reset_timeout has passed; then one trial call decides whether it
+    closes again or stays open for another period.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+class _Call:
+    __slots__ = ('done', 'response', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+class UpstreamProxy:
+    def __init__(self, base_url, pool_size=POOL_SIZE, timeout=UPSTREAM_TIMEOUT, ttl=CACHE_TTL,
+                 max_entries=CACHE_ENTRIES, breaker=None):
+        parts = urlsplit(base_url)
+        self.pool = ConnectionPool(parts.hostname, parts.port or 80, pool_size, timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get(self, target):
+        """
+        UpstreamResponse for a GET of target (path plus query). Raises
+        UpstreamError when the data server cannot answer and no earlier
+        copy of the response is cached.
+        """
+        path, _, query_string = target.partition('?')
+        key = cache_key(path, query_string)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                return cached[1]
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+        try:
+            call.response = self._fetch(target, cached[1] if cached is not None else None)
+        except UpstreamError as e:
+            if cached is not None:
+                # Serving a stale copy beats an error while the data server recovers
+                call.response = cached[1]
+            else:
+                call.error = e
+                raise
+        except Exception as e:
+            # Anything else (e.g. http.client.InvalidURL) is not an outage; waiters re-raise it too
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if call.response is not None and call.response.status == 200:
+                    self._store(key, call.response)
+            call.done.set()
+        return call.response
+
+    def post(self, target, body, content_type='application/json'):
+        """
+        UpstreamResponse for a POST of body to target. POSTs are neither
+        cached nor coalesced; failures raise UpstreamError as for get.
+        """
+        return self._call('POST', target, {'Content-Type': content_type}, body)
+
+    def _call(self, method, target, headers, body=None):
+        if not self.breaker.allow():
+            raise CircuitOpenError('data server circuit is open')
+        # Always ask for gzip: a cached copy then serves gzip clients as is,
+        # and the few identity clients pay for the decompression instead
+        headers['Accept-Encoding'] = 'gzip'
+        try:
+            response = self.pool.request(method, target, headers, body)
+        except UpstreamError:
+            self.breaker.record_failure()
+            raise
+        if response.status >= 500:
+            self.breaker.record_failure()
+            raise UpstreamError(f'{method} {target} returned {response.status}')
+        self.breaker.record_success()
+        return response
+
+    def _fetch(self, target, stale):
+        headers = {}
+        etag = dict(stale.headers).get('ETag') if stale is not None else None
+        if etag:
+            headers['If-None-Match'] = etag
+        response = self._call('GET', target, headers)
+        if response.status == 304 and stale is not None:
+            # Unchanged upstream: keep serving the bytes already held
+            return stale
+        return response
+
+    def _store(self, key, response):
+        self._cache[key] = (time.monotonic() + self.ttl, response)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+User Store - Favorites, notes and inbox behind one storage interface
+MemoryUserStore keeps the old process-local dicts. SQLiteUserStore persists
+to a WAL-mode database that several server processes can share: reads use
+per-thread connections and a per-user cache, writes are queued to one
+writer thread that commits everything waiting in a single transaction
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+
+USER_STORE = os.environ.get('USER_STORE', str(Path(__file__).parent / 'user_data.db'))
+USER_CACHE_SIZE = 1024
+MAX_BATCH = 256
+BUSY_TIMEOUT = 5.0
+
+_MISSING = object()
+
+def default_profile():
+    return {'favorites': [], 'notes': {}, 'inbox': [], 'preferences': {'theme': 'light'}}
+
+class UserStore(ABC):
+    """Storage interface used by the API handlers; reads return copies"""
+
+    @abstractmethod
+    def profile(self, user_id):
+        pass
+
+    def favorites(self, user_id):
+        return self.profile(user_id)['favorites']
+
+    def notes(self, user_id):
+        return self.profile(user_id)['notes']
+
+    def inbox(self, user_id):
+        return self.profile(user_id)['inbox']
+
+    @abstractmethod
+    def add_favorite(self, user_id, supplier_id):
+        pass
+
+    @abstractmethod
+    def remove_favorite(self, user_id, supplier_id):
+        pass
+
+    @abstractmethod
+    def update_favorites(self, user_id, add=(), remove=()):
+        """Add and remove many favorites as one change; adds are applied first"""
+
+    @abstractmethod
+    def save_note(self, user_id, supplier_id, note_text):
+        pass
+
+    @abstractmethod
+    def add_message(self, user_id, message):
+        pass
+
+class MemoryUserStore(UserStore):
+    """
+    Process-local dicts; nothing survives a restart. Favorites are a dict
+    used as an insertion-ordered set, so add, remove and membership are O(1).
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def profile(self, user_id):
+        # Copy under the lock so serialization never sees a concurrent mutation
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                return default_profile()
+            return {'favorites': list(user['favorites']), 'notes': user['notes'].copy(),
+                    'inbox': user['inbox'].copy()}
+
+    def favorites(self, user_id):
+        with self._lock:
+            user = self._users.get(user_id)
+            return list(user['favorites']) if user is not None else []
+
+    def _user(self, user_id):
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = {'favorites': {}, 'notes': {}, 'inbox': []}
+        return user
+
+    def add_favorite(self, user_id, supplier_id):
+        with self._lock:
+            self._user(user_id)['favorites'].setdefault(supplier_id)
+
+    def remove_favorite(self, user_id, supplier_id):
+        with self._lock:
+            self._user(user_id)['favorites'].pop(supplier_id, None)
+
+    def update_favorites(self, user_id, add=(), remove=()):
+        with self._lock:
+            favorites = self._user(user_id)['favorites']
+            for supplier_id in add:
+                favorites.setdefault(supplier_id)
+            for supplier_id in remove:
+                favorites.pop(supplier_id, None)
+
+    def save_note(self, user_id, supplier_id, note_text):
+        with self._lock:
+            self._user(user_id)['notes'][supplier_id] = note_text
+
+    def add_message(self, user_id, message):
+        with self._lock:
+            inbox = self._user(user_id)['inbox']
+            inbox.append({'id': len(inbox) + 1, 'message': message, 'timestamp': 'just now', 'read': False})
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS favorites (
+    user_id TEXT NOT NULL,
+    supplier_id,
+    UNIQUE (user_id, supplier_id)
+);
+CREATE TABLE IF NOT EXISTS notes (
+    user_id TEXT NOT NULL,
+    supplier_id,
+    note_text TEXT,
+    PRIMARY KEY (user_id, supplier_id)
+);
+CREATE TABLE IF NOT EXISTS inbox (
+    user_id TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    message TEXT,
+    timestamp TEXT,
+    read INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, message_id)
+);
+-- Bumped by every commit, so a process can tell other processes' writes from its own
+CREATE TABLE IF NOT EXISTS store_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_version (id, version) VALUES (1, 0);
+'''
+
+# Fixed statement text, so each connection's statement cache keeps them prepared
+ADD_USER = 'INSERT OR IGNORE INTO users (user_id) VALUES (?)'
+ADD_FAVORITE = 'INSERT OR IGNORE INTO favorites (user_id, supplier_id) VALUES (?, ?)'
+REMOVE_FAVORITE = 'DELETE FROM favorites WHERE user_id = ? AND supplier_id = ?'
+SAVE_NOTE = ('INSERT INTO notes (user_id, supplier_id, note_text) VALUES (?, ?, ?) '
+             'ON CONFLICT (user_id, supplier_id) DO UPDATE SET note_text = excluded.note_text')
+ADD_MESSAGE = ("INSERT INTO inbox (user_id, message_id, message, timestamp, read) "
+               "SELECT ?, COUNT(*) + 1, ?, 'just now', 0 FROM inbox WHERE user_id = ?")
+SELECT_VERSION = 'SELECT version FROM store_version WHERE id = 1'
+BUMP_VERSION = 'UPDATE store_version SET version = version + 1 WHERE id = 1'
+SELECT_USER = 'SELECT 1 FROM users WHERE user_id = ?'
+SELECT_FAVORITES = 'SELECT supplier_id FROM favorites WHERE user_id = ? ORDER BY rowid'
+SELECT_NOTES = 'SELECT supplier_id, note_text FROM notes WHERE user_id = ? ORDER BY rowid'
+SELECT_INBOX = 'SELECT message_id, message, timestamp, read FROM inbox WHERE user_id = ? ORDER BY message_id'
+
+class _Write:
+    __slots__ = ('user_id', 'statements', 'done', 'error')
+
+    def __init__(self, user_id, statements):
+        self.user_id = user_id
+        self.statements = statements
+        self.done = threading.Event()
+        self.error = None
+
+class SQLiteUserStore(UserStore):
+    """
+    WAL-mode SQLite store. A write returns once its transaction has
+    committed; writes that queue up while a commit is in flight share the
+    next one. A cached profile is dropped as soon as its user is written.
+    Every commit also bumps store_version; when PRAGMA data_version shows
+    a commit from another connection and store_version has moved past the
+    last version this process wrote, another process has written and the
+    whole cache is dropped.
+    """
+
+    def __init__(self, path=USER_STORE, cache_size=USER_CACHE_SIZE):
+        self.path = str(path)
+        self.cache_size = cache_size
+        connection = self._connect()
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(SCHEMA)
+        connection.close()
+        self._pid = None
+        self._open_lock = threading.Lock()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None,
+                                     check_same_thread=False, cached_statements=64)
+        # WAL with synchronous=NORMAL survives process crashes; only an OS
+        # crash or power loss can drop the most recent commits
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def _ensure_open(self):
+        # Connections and the writer thread do not survive fork(), so every
+        # pre-forked worker sets up its own on first use
+        if self._pid == os.getpid():
+            return
+        with self._open_lock:
+            if self._pid == os.getpid():
+                return
+            self._local = threading.local()
+            self._cache = OrderedDict()
+            self._cache_lock = threading.Lock()
+            self._generation = 0
+            self._version = None
+            self._queue = queue.Queue()
+            self._writer = threading.Thread(target=self._write_loop, name='user-store-writer', daemon=True)
+            self._writer.start()
+            self._pid = os.getpid()
+
+    def _reader(self):
+        local = self._local
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            connection = local.connection = self._connect()
+            local.data_version = None
+        version = connection.execute('PRAGMA data_version').fetchone()[0]
+        if version != local.data_version:
+            # Our own writer's commits change data_version too, but those
+            # already dropped the users they touched
+            self._sync_version(connection.execute(SELECT_VERSION).fetchone()[0])
+            local.data_version = version
+        return connection
+
+    def _sync_version(self, version):
+        """Drop the whole cache if store_version moved without this process writing"""
+        with self._cache_lock:
+            if version != self._version:
+                self._generation += 1
+                self._cache.clear()
+                self._version = version
+
+    def _invalidate(self, user_ids, version=None, committed=None):
+        """
+        Drop the written users after a batch; version is store_version when
+        the batch began and committed the version it wrote, if it committed
+        """
+        with self._cache_lock:
+            self._generation += 1
+            if committed is not None and self._version not in (version, committed):
+                # Another process committed since we last looked
+                self._cache.clear()
+            else:
+                for user_id in user_ids:
+                    self._cache.pop(user_id, None)
+            if committed is not None:
+                self._version = committed
+
+    def _load(self, user_id):
+        connection = self._reader()
+        with self._cache_lock:
+            # A cached None records that the user has no data yet
+            user = self._cache.get(user_id, _MISSING)
+            if user is not _MISSING:
+                self._cache.move_to_end(user_id)
+                return user
+            generation = self._generation
+        # One read transaction so the three tables come from the same snapshot
+        connection.execute('BEGIN')
+        try:
+            exists = connection.execute(SELECT_USER, (user_id,)).fetchone() is not None
+            favorites = [row[0] for row in connection.execute(SELECT_FAVORITES, (user_id,))]
+            notes = dict(connection.execute(SELECT_NOTES, (user_id,)).fetchall())
+            inbox = [{'id': message_id, 'message': json.loads(message), 'timestamp': timestamp, 'read': bool(read)}
+                     for message_id, message, timestamp, read in connection.execute(SELECT_INBOX, (user_id,))]
+        finally:
+            connection.execute('COMMIT')
+        user = {'favorites': favorites, 'notes': notes, 'inbox': inbox} if exists else None
+        with self._cache_lock:
+            # Skip the insert if a write landed while we were reading
+            if generation == self._generation:
+                self._cache[user_id] = user
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return user
+
+    def profile(self, user_id):
+        self._ensure_open()
+        user = self._load(user_id)
+        if user is None:
+            return default_profile()
+        return {key: value.copy() for key, value in user.items()}
+
+    def _write(self, user_id, *statements):
+        self._ensure_open()
+        write = _Write(user_id, ((ADD_USER, (user_id,)),) + statements)
+        self._queue.put(write)
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            version = committed = None
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                version = connection.execute(SELECT_VERSION).fetchone()[0]
+                for write in batch:
+                    # A savepoint per write keeps one bad request from failing the batch
+                    connection.execute('SAVEPOINT write')
+                    try:
+                        for sql, params in write.statements:
+                            if isinstance(params, list):
+                                connection.executemany(sql, params)
+                            else:
+                                connection.execute(sql, params)
+                    except Exception as e:
+                        connection.execute('ROLLBACK TO write')
+                        write.error = e
+                    connection.execute('RELEASE write')
+                connection.execute(BUMP_VERSION)
+                connection.execute('COMMIT')
+                committed = version + 1
+            except Exception as e:
+                if connection.in_transaction:
+                    connection.execute('ROLLBACK')
+                for write in batch:
+                    write.error = write.error or e
+            finally:
+                self._invalidate({write.user_id for write in batch}, version, committed)
+                for write in batch:
+                    write.done.set()
+
+    def add_favorite(self, user_id, supplier_id):
+        self._write(user_id, (ADD_FAVORITE, (user_id, supplier_id)))
+
+    def remove_favorite(self, user_id, supplier_id):
+        self._write(user_id, (REMOVE_FAVORITE, (user_id, supplier_id)))
+
+    def update_favorites(self, user_id, add=(), remove=()):
+        self._write(user_id, (ADD_FAVORITE, [(user_id, supplier_id) for supplier_id in add]),
+                    (REMOVE_FAVORITE, [(user_id, supplier_id) for supplier_id in remove]))
+
+    def save_note(self, user_id, supplier_id, note_text):
+        self._write(user_id, (SAVE_NOTE, (user_id, supplier_id, note_text)))
+
+    def add_message(self, user_id, message):
+        self._write(user_id, (ADD_MESSAGE, (user_id, json.dumps(message), user_id)))
+
+def open_user_store(spec=USER_STORE):
+    """'memory' for the in-process store, otherwise a SQLite database path"""
+    if spec == 'memory':
+        return MemoryUserStore()
+    return SQLiteUserStore(spec)